@@ -1,12 +1,14 @@
-import os
 import streamlit as st
 from streamlit_navigation_bar import st_navbar
-import msal
 import pages as pg
+from core.auth import complete_login, ensure_session, get_auth_client
+from core.warmup import start_warmup
 from dotenv import load_dotenv
 # Set page config to collapse sidebar by default
 load_dotenv()
 st.set_page_config(initial_sidebar_state="collapsed")
+# Build shared resources in the background once per process, starting with the first session
+start_warmup()
 
 # Apply dark mode styling and adjust navbar positioning
 st.markdown("""
@@ -80,44 +82,14 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-tenant_id = os.getenv("TENANT_ID")
-client_id = os.getenv("CLIENT_ID")
-client_secret = os.getenv("CLIENT_SECRET")
-authority = f"https://login.microsoftonline.com/{tenant_id}"
-redirect_uri = "https://stdemo123-nucsd5jcnm4gdr8zvaehaw.streamlit.app/"
-scopes = ["User.Read"]
-
-# Initialize MSAL application
-app = msal.ConfidentialClientApplication(
-    client_id,
-    authority=authority,
-    client_credential=client_secret,
-)
-
-# Initialize session states
-if "auth_flow_initiated" not in st.session_state:
-    st.session_state["auth_flow_initiated"] = False
-
 # Handle query parameters for callback after login
 query_params = st.query_params
 if "code" in query_params:
     try:
         # Acquire token using the authorization code
-        result = app.acquire_token_by_authorization_code(
-            query_params["code"],
-            scopes=scopes,
-            redirect_uri=redirect_uri,
-        )
-        
+        result = complete_login(query_params["code"])
+
         if "access_token" in result:
-            st.session_state["token"] = result["access_token"]
-            st.session_state["logged_in"] = True
-            if "id_token_claims" in result:
-                user_info = result["id_token_claims"]
-                st.session_state["user_name"] = user_info.get("name", "User")
-            else:
-                st.session_state["user_name"] = "User"
-            
             # Clear the query parameters to prevent reprocessing
             st.query_params.clear()
             st.rerun()
@@ -128,10 +100,9 @@ if "code" in query_params:
                 st.error("Login failed. Please try again.")
     except Exception as e:
         st.error(f"An error occurred during authentication: {str(e)}")
-        st.session_state["auth_flow_initiated"] = False
 
 # Define navigation pages and styles
-pages = ["Main", "Procurement Dashboard", "NL2SQL Chatbot"]
+pages = ["Main", "Procurement Dashboard", "NL2SQL Chatbot", "Admin"]
 logo_url = "https://user-images.githubusercontent.com/109947291/223796328-328e1a97-fbb7-48c6-b808-17a5122993b9.png"  # Direct URL
 styles = {
     "nav": {
@@ -161,8 +132,8 @@ options = {
     "show_sidebar": False,  # Hide sidebar toggle
 }
 
-# Render content based on login state
-if "logged_in" in st.session_state and st.session_state["logged_in"]:
+# Render content based on login state; an expiring token is refreshed silently
+if ensure_session():
     # Render navigation bar after login
     page = st_navbar(
         pages,
@@ -176,6 +147,7 @@ if "logged_in" in st.session_state and st.session_state["logged_in"]:
         "Main": pg.show_main,
         "Procurement Dashboard": pg.show_page1,
         "NL2SQL Chatbot": pg.show_page2,
+        "Admin": pg.show_page3,
     }
 
     # Execute the selected page function
@@ -184,11 +156,7 @@ if "logged_in" in st.session_state and st.session_state["logged_in"]:
         go_to()
 else:
     # Create login page with direct auth flow
-    login_url = app.get_authorization_request_url(
-        scopes,
-        redirect_uri=redirect_uri,
-        prompt="select_account"  # Force prompt to select account
-    )
+    login_url = get_auth_client().login_url()
     
     # Login page
     st.markdown(
@@ -0,0 +1,46 @@
+# Chat model stand-in for Azure OpenAI with a configurable response latency
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# Queries over the synthetic schema, picked per question
+CANNED_QUERIES = [
+    "SELECT TOP 10 asset_name, AVG(utilization_rate) AS utilization_rate FROM sc_stg.asset_utilization "
+    "GROUP BY asset_name ORDER BY AVG(utilization_rate) DESC",
+    "SELECT TOP 12 DATEFROMPARTS(YEAR(savings_date), MONTH(savings_date), 1) AS month_start, "
+    "SUM(actual_cost) AS actual_cost FROM sc_stg.cost_savings "
+    "GROUP BY DATEFROMPARTS(YEAR(savings_date), MONTH(savings_date), 1) ORDER BY month_start DESC",
+    "SELECT TOP 20 asset_name, SUM(usage_hours) AS usage_hours FROM sc_stg.asset_utilization "
+    "GROUP BY asset_name ORDER BY SUM(usage_hours) DESC",
+]
+
+
+class FakeChatModel(BaseChatModel):
+    latency: float = 0.5
+    answer: str = "Here is what the data shows."
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        prompt = "".join(str(message.content) for message in messages)
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": 20, "total_tokens": len(prompt) // 4 + 20}
+        tools = kwargs.get("tools")
+        if tools:
+            query = CANNED_QUERIES[sum(map(ord, prompt)) % len(CANNED_QUERIES)]
+            message = AIMessage(
+                content="",
+                tool_calls=[{"name": tools[0]["function"]["name"], "args": {"query": query}, "id": "call_0"}],
+                usage_metadata=usage,
+            )
+        else:
+            message = AIMessage(content=self.answer, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
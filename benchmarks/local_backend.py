@@ -0,0 +1,107 @@
+# Local SQLite stand-in for the Azure SQL database used by the dashboard and chatbot.
+# T-SQL statements are transpiled to SQLite with sqlglot at execution time, and the
+# sc_stg schema is an attached database file.
+import datetime
+import re
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import sqlglot
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+SCHEMA = "sc_stg"
+
+
+def seed(directory, assets=1000, records_per_asset=12, days=730, seed=0):
+    # Write main.sqlite and sc_stg.sqlite with synthetic asset_utilization,
+    # dim_calendar and cost_savings tables; returns the SQLAlchemy URL
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    main_path = directory / "main.sqlite"
+    schema_path = directory / f"{SCHEMA}.sqlite"
+    for path in (main_path, schema_path):
+        path.unlink(missing_ok=True)
+    sqlite3.connect(main_path).close()
+
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2023-01-01")
+    rows = assets * records_per_asset
+    asset_utilization = pd.DataFrame({
+        "asset_name": np.repeat([f"Asset {i:06d}" for i in range(assets)], records_per_asset),
+        "asset_turnover_rate": rng.random(rows) * 3,
+        "utilization_rate": rng.random(rows) * 100,
+        "last_maintenance_date": (start + pd.to_timedelta(rng.integers(0, days, rows), unit="D")).strftime("%Y-%m-%d"),
+        "usage_hours": rng.random(rows) * 500,
+    })
+    calendar = pd.date_range(start, periods=days, freq="D")
+    dim_calendar = pd.DataFrame({"date": calendar.strftime("%Y-%m-%d")})
+    budget = rng.random(days) * 1_000_000
+    cost_savings = pd.DataFrame({
+        "savings_date": dim_calendar["date"],
+        "actual_cost": budget * rng.uniform(0.7, 1.2, days),
+        "budget_cost": budget,
+    })
+
+    with sqlite3.connect(schema_path) as connection:
+        asset_utilization.to_sql("asset_utilization", connection, index=False)
+        dim_calendar.to_sql("dim_calendar", connection, index=False)
+        cost_savings.to_sql("cost_savings", connection, index=False)
+        connection.execute("CREATE INDEX ix_asset_utilization_date ON asset_utilization (last_maintenance_date)")
+        connection.execute("CREATE INDEX ix_cost_savings_date ON cost_savings (savings_date)")
+    return f"sqlite:///{main_path}", schema_path
+
+
+def _year(value):
+    return int(str(value)[:4]) if value is not None else None
+
+
+def _month(value):
+    return int(str(value)[5:7]) if value is not None else None
+
+
+def _date_from_parts(year, month, day):
+    return datetime.date(int(year), int(month), int(day)).isoformat() if year is not None else None
+
+
+def _transpile(statement, parameters):
+    # Rewrite T-SQL for SQLite. Positional "?" markers are numbered first because
+    # clauses can move (TOP (?) becomes a trailing LIMIT ?).
+    if statement.lstrip().upper().startswith("PRAGMA"):
+        return statement, parameters
+    positional = isinstance(parameters, (tuple, list))
+    numbered = statement
+    if positional:
+        counter = iter(range(len(parameters)))
+        numbered = re.sub(r"\?", lambda _: f":p{next(counter)}", statement)
+    try:
+        sqlite_sql = sqlglot.transpile(numbered, read="tsql", write="sqlite")[0]
+    except sqlglot.errors.SqlglotError:
+        return statement, parameters
+    if not positional:
+        return sqlite_sql, parameters
+    order = [int(index) for index in re.findall(r":p(\d+)", sqlite_sql)]
+    return re.sub(r":p\d+", "?", sqlite_sql), tuple(parameters[index] for index in order)
+
+
+def install(schema_path):
+    # Global hooks: attach sc_stg and T-SQL helpers on every new SQLite connection,
+    # and transpile each statement before it reaches the driver
+    @event.listens_for(Pool, "connect")
+    def attach_schema(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        dbapi_connection.execute(f"ATTACH DATABASE '{schema_path}' AS {SCHEMA}")
+        dbapi_connection.create_function("YEAR", 1, _year, deterministic=True)
+        dbapi_connection.create_function("MONTH", 1, _month, deterministic=True)
+        dbapi_connection.create_function("DATEFROMPARTS", 3, _date_from_parts, deterministic=True)
+        dbapi_connection.create_function("DATE_FROM_PARTS", 3, _date_from_parts, deterministic=True)
+
+    @event.listens_for(Engine, "before_cursor_execute", retval=True)
+    def transpile(connection, cursor, statement, parameters, context, executemany):
+        if connection.dialect.name != "sqlite" or executemany:
+            return statement, parameters
+        return _transpile(statement, parameters)
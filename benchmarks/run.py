@@ -0,0 +1,222 @@
+# Reproducible dashboard and chatbot benchmarks against local stand-ins.
+#
+#   python -m benchmarks.run                     # run and compare with baselines.json
+#   python -m benchmarks.run --save-baseline     # run and store the results as the new baseline
+#   python -m benchmarks.run --assets 50000 --sessions 1 8 32 --llm-latency 1.0
+#
+# The database is a seeded SQLite file (see local_backend.py) and the chat model is
+# FakeChatModel, so no Azure services are needed.
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+BASELINE_PATH = Path(__file__).with_name("baselines.json")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--assets", type=int, default=5000)
+    parser.add_argument("--records-per-asset", type=int, default=12)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16], help="concurrent chatbot sessions")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workdir", default=None, help="where the SQLite files, snapshots and logs go")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression against the baseline")
+    return parser.parse_args(argv)
+
+
+def configure(args):
+    # Point the app at local stand-ins; must run before any core module is imported
+    from benchmarks import local_backend
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="stdemo-bench-"))
+    url, schema_path = local_backend.seed(workdir / "db", args.assets, args.records_per_asset, args.days)
+    os.environ.update({
+        "DATABASE_URL": url,
+        "SCHEMA_NAME": local_backend.SCHEMA,
+        "SNAPSHOT_DIR": str(workdir / "snapshots"),
+        "TELEMETRY_DB": str(workdir / "telemetry.sqlite"),
+        "CHATBOT_REPAIR_LOG": str(workdir / "sql_repairs.jsonl"),
+        "CHAT_MEMORY_DB": str(workdir / "chat" / "checkpoints.sqlite"),
+        "CHAT_RESULT_DIR": str(workdir / "chat" / "results"),
+        # tiktoken would download its encoding; the estimate keeps the run offline
+        "CHATBOT_PROMPT_TOKENIZER": "chars",
+    })
+    os.environ.pop("QUERY_CACHE_DIR", None)
+    os.environ.pop("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", None)
+    local_backend.install(schema_path)
+    return workdir
+
+
+def median_time(func, repeat, before=None):
+    timings = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def bench_queries(args):
+    from core.dashboard_data import get_snapshots, load_asset_page, load_monthly_spend
+    from core.query_cache import get_query_cache
+
+    cache = get_query_cache()
+    snapshots = get_snapshots()
+    return {
+        "query_assets_full_rebuild_s": median_time(lambda: snapshots["assets"].refresh(full=True), args.repeat),
+        "query_assets_incremental_s": median_time(lambda: snapshots["assets"].refresh(), args.repeat),
+        "query_spend_full_rebuild_s": median_time(lambda: snapshots["spend"].refresh(full=True), args.repeat),
+        "query_spend_range_s": median_time(
+            lambda: load_monthly_spend("2023-03-01", "2024-03-01"), args.repeat, before=cache.invalidate
+        ),
+        "query_asset_page_s": median_time(lambda: load_asset_page(50), args.repeat, before=cache.invalidate),
+    }
+
+
+def render_dashboard():
+    from pages.dashboard import show_page1
+    show_page1()
+
+
+def bench_render(args):
+    from streamlit.testing.v1 import AppTest
+
+    from core.dashboard_data import refresh_snapshots
+    from core.query_cache import get_query_cache
+
+    def run():
+        app = AppTest.from_function(render_dashboard, default_timeout=300)
+        app.run()
+        if app.exception:
+            raise RuntimeError(f"dashboard page raised: {app.exception[0].message}")
+
+    # Cold: empty query cache and freshly rebuilt snapshots
+    def reset():
+        get_query_cache().invalidate()
+        refresh_snapshots(full=True)
+
+    results = {
+        "render_dashboard_cold_s": median_time(run, args.repeat, before=reset),
+        "render_dashboard_warm_s": median_time(run, args.repeat),
+    }
+    tracemalloc.start()
+    run()
+    results["render_dashboard_peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return results
+
+
+def wait_for_answer(request):
+    # Drain a request's events; returns the final (answer, error). Node errors end the
+    # graph without raising, so they only show up in the state updates.
+    answer, error = "", ""
+    while True:
+        kind, payload = request.events.get()
+        if kind == "end":
+            return answer, error
+        mode, chunk = payload
+        if mode != "updates":
+            continue
+        for update in chunk.values():
+            update = update or {}
+            if "error" in update:
+                error = update["error"]
+            if update.get("answer"):
+                answer = update["answer"]
+
+
+def bench_chatbot(args):
+    from benchmarks.fake_llm import FakeChatModel
+    from core.chat_executor import ChatExecutor
+    from core.chatbot_service import ChatbotService
+
+    service = ChatbotService(llm=FakeChatModel(latency=args.llm_latency))
+    # One executor for every run: the service's semaphores belong to its event loop
+    executor = ChatExecutor(service)
+    results = {"chatbot_cold_start_s": service.startup_seconds}
+    for sessions in args.sessions:
+        service.sql_cache.clear()
+        started = time.perf_counter()
+        # Distinct questions, so every request goes through the LLM, in conversations
+        # no earlier run has used, so none of them is treated as a follow-up
+        nonce = uuid.uuid4().hex[:8]
+        requests = [
+            (executor.submit(f"session-{nonce}-{sessions}-{i}", service.turn_input(f"Which assets are used most? variant {sessions}-{i}")), time.perf_counter())
+            for i in range(sessions)
+        ]
+        latencies = []
+        for request, submitted in requests:
+            answer, error = wait_for_answer(request)
+            latencies.append(time.perf_counter() - submitted)
+            if request.error or error or not answer:
+                raise RuntimeError(f"chatbot request failed: {request.error or error or 'no answer'}")
+        elapsed = time.perf_counter() - started
+        results[f"chatbot_{sessions}_sessions_per_second"] = sessions / elapsed
+        results[f"chatbot_{sessions}_sessions_p95_s"] = sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)]
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Returns regressed metric names; "_per_second" metrics are better when higher
+    regressions = []
+    print(f"{'metric':<42} {'value':>12} {'baseline':>12} {'change':>8}")
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base is None or base == 0:
+            print(f"{name:<42} {value:>12.4f} {'-':>12} {'':>8}")
+            continue
+        change = (value - base) / base
+        worse = -change if name.endswith("_per_second") else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{name:<42} {value:>12.4f} {base:>12.4f} {change:>+7.0%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    workdir = configure(args)
+    print(f"Seeded {args.assets:,} assets x {args.records_per_asset} records, {args.days} days in {workdir}")
+
+    results = {}
+    results.update(bench_queries(args))
+    results.update(bench_render(args))
+    results.update(bench_chatbot(args))
+
+    # Results are only comparable at the same scale
+    config = {
+        "assets": args.assets,
+        "records_per_asset": args.records_per_asset,
+        "days": args.days,
+        "llm_latency": args.llm_latency,
+        "sessions": args.sessions,
+    }
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps({"config": config, "results": results}, indent=2, sort_keys=True) + "\n")
+        print(f"Saved baseline to {BASELINE_PATH}")
+        compare(results, {}, args.tolerance)
+        return 0
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {"config": config, "results": {}}
+    if baseline["config"] != config:
+        print(f"Baseline was recorded with {baseline['config']}; not comparing.")
+        compare(results, {}, args.tolerance)
+        return 0
+    regressions = compare(results, baseline["results"], args.tolerance)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+import msal
+import streamlit as st
+from dotenv import load_dotenv
+
+load_dotenv()
+
+tenant_id = os.getenv("TENANT_ID")
+client_id = os.getenv("CLIENT_ID")
+client_secret = os.getenv("CLIENT_SECRET")
+authority = f"https://login.microsoftonline.com/{tenant_id}"
+redirect_uri = os.getenv("REDIRECT_URI", "https://stdemo123-nucsd5jcnm4gdr8zvaehaw.streamlit.app/")
+scopes = ["User.Read"]
+
+# Optional file the server-side token cache is persisted to, so restarts keep signed-in sessions
+TOKEN_CACHE_PATH = os.getenv("MSAL_TOKEN_CACHE_PATH")
+# Refresh the user's access token this many seconds before it actually expires
+TOKEN_REFRESH_MARGIN = int(os.getenv("AUTH_TOKEN_REFRESH_MARGIN", 300))
+
+
+class AuthClient:
+    # One MSAL application per process. Authority discovery happens once, and tokens of all
+    # sessions live in one serializable cache; each session only keeps its account id.
+    def __init__(self, cache_path=TOKEN_CACHE_PATH):
+        self._cache_path = Path(cache_path) if cache_path else None
+        self._lock = threading.Lock()
+        self.cache = msal.SerializableTokenCache()
+        if self._cache_path and self._cache_path.exists():
+            self.cache.deserialize(self._cache_path.read_text())
+        self.app = msal.ConfidentialClientApplication(
+            client_id,
+            authority=authority,
+            client_credential=client_secret,
+            token_cache=self.cache,
+        )
+        self._login_url = None
+
+    def login_url(self):
+        # Built on first use only, i.e. when a signed-out session shows the login page
+        with self._lock:
+            if self._login_url is None:
+                self._login_url = self.app.get_authorization_request_url(
+                    scopes,
+                    redirect_uri=redirect_uri,
+                    prompt="select_account"  # Force prompt to select account
+                )
+            return self._login_url
+
+    def redeem_code(self, code):
+        result = self.app.acquire_token_by_authorization_code(code, scopes=scopes, redirect_uri=redirect_uri)
+        self._persist()
+        return result
+
+    def acquire_silent(self, account_id):
+        # Served from the cache, or refreshed with the cached refresh token; None if the user must sign in
+        accounts = self.app.get_accounts()
+        account = next((a for a in accounts if a["home_account_id"] == account_id), None)
+        if account is None:
+            return None
+        result = self.app.acquire_token_silent(scopes, account=account)
+        self._persist()
+        return result if result and "access_token" in result else None
+
+    def _persist(self):
+        if self._cache_path is None or not self.cache.has_state_changed:
+            return
+        with self._lock:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._cache_path.write_text(self.cache.serialize())
+            self.cache.has_state_changed = False
+
+
+@st.cache_resource
+def get_auth_client():
+    return AuthClient()
+
+
+def store_session(result):
+    st.session_state["token"] = result["access_token"]
+    st.session_state["token_expires_at"] = time.time() + int(result.get("expires_in", 0))
+    st.session_state["logged_in"] = True
+    claims = result.get("id_token_claims")
+    if claims:
+        st.session_state["account_id"] = f"{claims.get('oid')}.{claims.get('tid')}"
+        st.session_state["user_name"] = claims.get("name", "User")
+    elif "user_name" not in st.session_state:
+        st.session_state["user_name"] = "User"
+
+
+def complete_login(code):
+    # Exchange the authorization code from the redirect; returns the MSAL result for error reporting
+    result = get_auth_client().redeem_code(code)
+    if "access_token" in result:
+        store_session(result)
+    return result
+
+
+def ensure_session():
+    # True while the session holds a usable token, refreshing it silently shortly before expiry
+    if not st.session_state.get("logged_in"):
+        return False
+    if st.session_state.get("token_expires_at", 0) - time.time() > TOKEN_REFRESH_MARGIN:
+        return True
+    result = None
+    if "account_id" in st.session_state:
+        try:
+            result = get_auth_client().acquire_silent(st.session_state["account_id"])
+        except Exception:
+            result = None
+    if result is None:
+        # No cached refresh token for this account; fall back to interactive login
+        st.session_state["logged_in"] = False
+        return False
+    store_session(result)
+    return True
@@ -0,0 +1,175 @@
+import asyncio
+import itertools
+import os
+import queue
+import threading
+from collections import OrderedDict, deque
+
+import streamlit as st
+from dotenv import load_dotenv
+
+from core.chat_memory import open_checkpointer, prune_thread
+from core.chatbot_service import get_chatbot_service
+from core.telemetry import start_run
+
+load_dotenv()
+
+# Questions allowed to run the graph at the same time; the rest wait in the queue
+MAX_RUNNING_REQUESTS = int(os.getenv("CHATBOT_MAX_RUNNING_REQUESTS", 8))
+# Questions a single session may have waiting before new ones are rejected
+MAX_QUEUED_PER_SESSION = int(os.getenv("CHATBOT_MAX_QUEUED_PER_SESSION", 3))
+# Hard limit on one question from start of execution to answer, in seconds
+REQUEST_TIMEOUT = float(os.getenv("CHATBOT_REQUEST_TIMEOUT", 120))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed out"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class ChatRequest:
+    # A question submitted from a Streamlit session. The script thread reads
+    # progress from `events` while the executor loop runs the graph.
+    _ids = itertools.count(1)
+
+    def __init__(self, executor, session_id, state):
+        self.id = next(self._ids)
+        self.session_id = session_id
+        self.state = state
+        self.status = QUEUED
+        self.error = None
+        # ("stream", (mode, chunk)) items, then a final ("end", status)
+        self.events = queue.Queue()
+        self._executor = executor
+        self._task = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED, TIMED_OUT)
+
+    def queue_position(self):
+        return self._executor.queue_position(self)
+
+    def cancel(self):
+        self._executor.cancel(self)
+
+
+class ChatExecutor:
+    def __init__(self, service, max_running=MAX_RUNNING_REQUESTS, timeout=REQUEST_TIMEOUT):
+        self.service = service
+        self.max_running = max_running
+        self.timeout = timeout
+        # session_id -> deque of waiting requests; sessions are served round-robin
+        self._waiting = OrderedDict()
+        self._running = set()
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="chat-executor", daemon=True)
+        self._thread.start()
+        # Conversation memory: one checkpoint thread per session, on this executor's loop
+        self.checkpointer = asyncio.run_coroutine_threadsafe(open_checkpointer(), self._loop).result()
+        self.graph = service.build_graph(checkpointer=self.checkpointer)
+
+    def submit(self, session_id, state):
+        request = ChatRequest(self, session_id, state)
+        with self._lock:
+            waiting = self._waiting.setdefault(session_id, deque())
+            if len(waiting) >= MAX_QUEUED_PER_SESSION:
+                raise QueueFullError("Too many questions are already waiting for this session.")
+            waiting.append(request)
+        self._loop.call_soon_threadsafe(self._dispatch)
+        return request
+
+    def cancel(self, request):
+        with self._lock:
+            waiting = self._waiting.get(request.session_id)
+            if waiting and request in waiting:
+                waiting.remove(request)
+                self._finish(request, CANCELLED)
+                return
+        if request._task is not None:
+            self._loop.call_soon_threadsafe(request._task.cancel)
+
+    def queue_position(self, request):
+        # 1-based position in the round-robin order, or 0 once running
+        with self._lock:
+            order = self._fair_order()
+        return order.index(request) + 1 if request in order else 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": len(self._running),
+                "queued": sum(len(waiting) for waiting in self._waiting.values()),
+                "sessions_waiting": sum(1 for waiting in self._waiting.values() if waiting),
+            }
+
+    def _fair_order(self):
+        # Interleave sessions: first question of every session, then the second, ...
+        columns = [list(waiting) for waiting in self._waiting.values()]
+        return [request for row in itertools.zip_longest(*columns) for request in row if request is not None]
+
+    def _dispatch(self):
+        # Runs on the loop thread; starts waiting requests while there are free slots
+        with self._lock:
+            while len(self._running) < self.max_running:
+                request = self._next_request()
+                if request is None:
+                    break
+                request.status = RUNNING
+                self._running.add(request)
+                request._task = self._loop.create_task(self._run(request))
+
+    def _next_request(self):
+        # A session's questions run one at a time, since each continues its conversation
+        busy = {request.session_id for request in self._running}
+        for session_id in list(self._waiting):
+            if session_id in busy:
+                continue
+            waiting = self._waiting.pop(session_id)
+            if waiting:
+                request = waiting.popleft()
+                # Re-append at the end so the next pick goes to another session
+                if waiting:
+                    self._waiting[session_id] = waiting
+                return request
+        return None
+
+    async def _run(self, request):
+        status = DONE
+        # Groups this question's node records in telemetry
+        start_run()
+        try:
+            async with asyncio.timeout(self.timeout):
+                config = {"configurable": {"thread_id": request.session_id}}
+                async for mode, chunk in self.graph.astream(request.state, config, stream_mode=["updates", "messages"]):
+                    request.events.put(("stream", (mode, chunk)))
+                await prune_thread(self.checkpointer, request.session_id)
+        except TimeoutError:
+            status = TIMED_OUT
+            request.error = f"The question took longer than {self.timeout:.0f}s and was stopped."
+        except asyncio.CancelledError:
+            status = CANCELLED
+        except Exception as e:
+            status = FAILED
+            request.error = str(e)
+        finally:
+            with self._lock:
+                self._running.discard(request)
+            self._finish(request, status)
+            self._dispatch()
+
+    def _finish(self, request, status):
+        request.status = status
+        request.events.put(("end", status))
+
+
+@st.cache_resource
+def get_chat_executor():
+    return ChatExecutor(get_chatbot_service())
@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import aiosqlite
+import pandas as pd
+import streamlit as st
+from dotenv import load_dotenv
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+load_dotenv()
+
+# Local SQLite store for per-session graph checkpoints
+CHAT_MEMORY_DB = os.getenv("CHAT_MEMORY_DB", ".chat/checkpoints.sqlite")
+# Query results kept for follow-up questions, as Parquet files. These are raw
+# rows from the database, kept on disk for up to CHAT_RESULT_TTL (24 hours by
+# default) plus one expiry interval; place the directory accordingly.
+CHAT_RESULT_DIR = os.getenv("CHAT_RESULT_DIR", ".chat/results")
+# How long a stored result stays available for follow-ups, in seconds
+CHAT_RESULT_TTL = int(os.getenv("CHAT_RESULT_TTL", 86400))
+# How often expired result files are looked for, in seconds
+CHAT_RESULT_EXPIRE_INTERVAL = int(os.getenv("CHAT_RESULT_EXPIRE_INTERVAL", 3600))
+# Results also kept in memory, most recently used last
+CHAT_RESULT_CACHE_ENTRIES = int(os.getenv("CHAT_RESULT_CACHE_ENTRIES", 64))
+# Longest SQL and answer text of a remembered turn that goes back into a prompt
+MAX_TURN_CHARS = 600
+
+FILTER_OPERATORS = ("=", "!=", ">", ">=", "<", "<=", "contains")
+
+
+def unique_columns(columns):
+    # Distinct, non-empty column names, which Parquet and column lookups need:
+    # SQL Server names unaliased expressions '' and a query may repeat a name
+    names, seen = [], set()
+    for position, column in enumerate(columns, 1):
+        name = str(column) or f"column_{position}"
+        candidate, suffix = name, 2
+        while candidate in seen:
+            candidate, suffix = f"{name}_{suffix}", suffix + 1
+        seen.add(candidate)
+        names.append(candidate)
+    return names
+
+
+class ResultStore:
+    # Query results by id. Graph state only carries the id: checkpoints stay
+    # small and never have to serialize a DataFrame.
+    def __init__(self, directory=CHAT_RESULT_DIR, ttl=CHAT_RESULT_TTL, max_entries=CHAT_RESULT_CACHE_ENTRIES,
+                 expire_interval=CHAT_RESULT_EXPIRE_INTERVAL):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.expire_interval = expire_interval
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        self._expired_at = 0.0
+        # Clear out what an earlier process left behind
+        self._expire()
+
+    def save(self, df):
+        result_id = uuid.uuid4().hex
+        self.directory.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(self.directory / f"{result_id}.parquet")
+        self._remember(result_id, df)
+        if time.time() - self._expired_at >= self.expire_interval:
+            self._expire()
+        return result_id
+
+    def load(self, result_id):
+        # The stored frame, or None once it has expired
+        with self._lock:
+            df = self._frames.get(result_id)
+            if df is not None:
+                self._frames.move_to_end(result_id)
+                return df
+        path = self.directory / f"{result_id}.parquet"
+        if not path.exists():
+            return None
+        df = pd.read_parquet(path)
+        self._remember(result_id, df)
+        return df
+
+    def _remember(self, result_id, df):
+        with self._lock:
+            self._frames[result_id] = df
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+
+    def _expire(self):
+        self._expired_at = time.time()
+        cutoff = self._expired_at - self.ttl
+        for path in self.directory.glob("*.parquet"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+@st.cache_resource
+def get_result_store():
+    return ResultStore()
+
+
+async def open_checkpointer(path=CHAT_MEMORY_DB):
+    # Must be awaited on the event loop that will run the graph
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    checkpointer = AsyncSqliteSaver(await aiosqlite.connect(path))
+    await checkpointer.setup()
+    return checkpointer
+
+
+async def prune_thread(checkpointer, thread_id):
+    # Only the latest checkpoint of a conversation is ever resumed; drop the rest
+    # so the store grows with the number of sessions, not the number of steps
+    async with checkpointer.lock:
+        for table in ("checkpoints", "writes"):
+            await checkpointer.conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_id < "
+                "(SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ?)",
+                (thread_id, thread_id),
+            )
+        await checkpointer.conn.commit()
+
+
+def _clip(text, limit=MAX_TURN_CHARS):
+    text = str(text or "")
+    return text if len(text) <= limit else text[:limit] + " ..."
+
+
+def render_history(summary, turns):
+    # Earlier conversation as prompt text: the rolling summary, then recent turns verbatim
+    parts = []
+    if summary:
+        parts.append(f"Summary of the earlier conversation:\n{summary}")
+    for number, turn in enumerate(turns, 1):
+        lines = [f"Turn {number} question: {turn['question']}", f"SQL: {_clip(turn['query'])}"]
+        if turn.get("columns"):
+            lines.append(f"Result: {turn['row_count']} rows with columns {', '.join(turn['columns'])}")
+        lines.append(f"Answer: {_clip(turn['answer'])}")
+        parts.append("\n".join(lines))
+    return "\n\n".join(parts)
+
+
+def _coerce(value, series):
+    if pd.api.types.is_bool_dtype(series):
+        return str(value).strip().lower() in ("1", "true", "yes")
+    if pd.api.types.is_numeric_dtype(series):
+        return float(value)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Timestamp(value)
+    return str(value)
+
+
+def apply_filters(df, filters):
+    # Narrow a stored result with [{"column", "operator", "value"}] conditions.
+    # Raises ValueError when a condition cannot be applied to this frame.
+    mask = pd.Series(True, index=df.index)
+    for condition in filters:
+        column, operator, value = condition["column"], condition["operator"], condition["value"]
+        if column not in df.columns:
+            raise ValueError(f"Column {column!r} is not in the previous result")
+        if operator not in FILTER_OPERATORS:
+            raise ValueError(f"Unsupported filter operator {operator!r}")
+        series = df[column]
+        if operator == "contains":
+            mask &= series.astype(str).str.contains(str(value), case=False, regex=False)
+            continue
+        try:
+            value = _coerce(value, series)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Cannot compare {column!r} with {condition['value']!r}: {e}")
+        mask &= {
+            "=": series == value,
+            "!=": series != value,
+            ">": series > value,
+            ">=": series >= value,
+            "<": series < value,
+            "<=": series <= value,
+        }[operator]
+    return df[mask].reset_index(drop=True)
+
+
+def describe_filters(filters):
+    return " AND ".join(f"{c['column']} {c['operator']} {c['value']!r}" for c in filters)
@@ -0,0 +1,451 @@
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Annotated
+
+import streamlit as st
+from dotenv import load_dotenv
+from langchain_core.prompts import PromptTemplate
+from langchain_openai import AzureChatOpenAI
+from langgraph.graph import END, START, StateGraph
+from typing_extensions import TypedDict
+
+from core.chat_memory import apply_filters, describe_filters, get_result_store, render_history, unique_columns
+from core.db import get_engine
+from core.fetch import fetch_frame
+from core.prompt_builder import PromptBuilder
+from core.result_summary import summarize_result
+from core.schema_catalog import get_schema_catalog
+from core.sql_cache import get_sql_cache
+from core.sql_guard import QUERY_TIMEOUT, GuardError, guard_query, row_limit
+from core.telemetry import UsageCallback, annotate, instrument
+
+load_dotenv()
+
+# Upper bounds on in-flight LLM and database calls across all sessions
+LLM_CONCURRENCY = int(os.getenv("CHATBOT_LLM_CONCURRENCY", 4))
+DB_CONCURRENCY = int(os.getenv("CHATBOT_DB_CONCURRENCY", 4))
+# Repair attempts after a rejected or failed query, and the completion budget for each
+REPAIR_MAX_ATTEMPTS = int(os.getenv("CHATBOT_REPAIR_MAX_ATTEMPTS", 2))
+REPAIR_MAX_TOKENS = int(os.getenv("CHATBOT_REPAIR_MAX_TOKENS", 400))
+# JSON lines log of successful repairs
+REPAIR_LOG = os.getenv("CHATBOT_REPAIR_LOG", ".logs/sql_repairs.jsonl")
+# Turns of a conversation kept verbatim; older ones are folded into a rolling summary
+MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", 4))
+# Completion budget for the rolling summary, which bounds its length
+MEMORY_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_MEMORY_SUMMARY_MAX_TOKENS", 300))
+
+# Turns a follow-up into a question that stands on its own, and spots follow-ups
+# that only narrow the previous result so it can be filtered instead of re-queried
+followup_template = '''
+You are helping a user explore a database through questions answered with SQL.
+
+{history}
+
+Previous result columns: {columns}
+
+New question: {input}
+
+Rewrite the new question so it can be understood without the conversation.
+If it only narrows the previous result by conditions on the previous result columns,
+set filter_only and list those conditions; otherwise leave the filters empty.
+'''
+
+followup_prompt_template = PromptTemplate(
+    input_variables=["history", "columns", "input"],
+    template=followup_template
+)
+
+summary_template = '''
+Update the summary of a conversation about a database. Keep the topics, filters,
+entities and findings a later question might refer to, in at most 150 words.
+
+Current summary:
+{summary}
+
+Turns to add:
+{turns}
+'''
+
+summary_prompt_template = PromptTemplate(
+    input_variables=["summary", "turns"],
+    template=summary_template
+)
+
+# Short prompt for fixing a query; only the tables most relevant to the question are included
+repair_template = '''
+The following {dialect} (T-SQL) query was written to answer the question below, but it failed.
+Return a corrected query. Keep it a single read-only SELECT and do not use LIMIT clauses.
+
+Question: {input}
+
+Failed query:
+{query}
+
+Error:
+{error}
+
+Relevant tables:
+{table_info}
+'''
+
+repair_prompt_template = PromptTemplate(
+    input_variables=["input", "query", "error", "table_info", "dialect"],
+    template=repair_template
+)
+
+
+# State definition. With the checkpointer it persists per conversation: the
+# per-question fields are reset by turn_input(), history and summary carry over.
+class State(TypedDict):
+    # The question as asked; replaced by its standalone form when it is a follow-up
+    question: str
+    query: str
+    result: str
+    # Key of the full result in the result store (see core/chat_memory.py)
+    result_id: str
+    answer: str
+    cache_hit: str
+    estimated_cost: float
+    row_count: int
+    # Rows the query's result can be cut off at (see sql_guard.row_limit); fewer rows means it is complete
+    row_limit: int
+    # Prompt tokens of the query-generation call, and how many were served from the provider's prompt cache
+    prompt_tokens: int
+    cached_tokens: int
+    error: str
+    # Failed {"query", "error"} pairs that were sent to repair_query
+    repairs: list
+    # Conditions that narrow the previous result, for filter-only follow-ups
+    filters: list
+    # Recent turns ({"question", "query", "answer", "result_id", "columns", "row_count", "row_limit"})
+    # and the summary of older ones
+    history: list
+    summary: str
+
+
+class QueryOutput(TypedDict):
+    query: Annotated[str, ..., "Syntactically valid SQL query."]
+
+
+class FilterCondition(TypedDict):
+    column: Annotated[str, ..., "A column of the previous result."]
+    operator: Annotated[str, ..., "One of =, !=, >, >=, <, <=, contains."]
+    value: Annotated[str, ..., "Value to compare with, as text; dates as YYYY-MM-DD."]
+
+
+class FollowUp(TypedDict):
+    question: Annotated[str, ..., "The new question rewritten to stand on its own."]
+    filter_only: Annotated[bool, ..., "Whether the question only narrows the previous result."]
+    filters: Annotated[list[FilterCondition], ..., "Conditions on previous result columns; empty unless filter_only."]
+
+
+def azure_chat_model(**kwargs):
+    # AzureChatOpenAI has no stream_usage field (Azure rejects stream_options); unknown
+    # keyword arguments end up in model_kwargs and are sent to the API on every call
+    return AzureChatOpenAI(deployment_name="gpt-4o", api_version='2024-08-01-preview', **kwargs)
+
+
+class ChatbotService:
+    # Everything a question needs that does not depend on the Streamlit session.
+    # Built once per process and shared by all sessions; nodes keep no per-request state.
+    def __init__(self, llm=None, repair_llm=None):
+        # llm / repair_llm default to Azure OpenAI; benchmarks pass local stand-ins
+        started = time.perf_counter()
+        # Token usage is reported to telemetry through the callback
+        usage = UsageCallback()
+        # Only the answer is streamed to the page. Streamed responses carry no token
+        # usage (Azure gets no stream_options), so every other call is made in one piece;
+        # otherwise the "messages" stream mode would stream them too.
+        self.answer_llm = llm or azure_chat_model(callbacks=[usage])
+        self.llm = llm or azure_chat_model(disable_streaming=True, callbacks=[usage])
+        # include_raw keeps the response message, whose usage reports cached prompt tokens
+        self.structured_llm = self.llm.with_structured_output(QueryOutput, method="function_calling", include_raw=True)
+        self.repair_llm = (repair_llm or llm or azure_chat_model(
+            max_tokens=REPAIR_MAX_TOKENS, disable_streaming=True, callbacks=[usage]
+        )).with_structured_output(QueryOutput, method="function_calling")
+        self.followup_llm = self.llm.with_structured_output(FollowUp, method="function_calling")
+        self.summary_llm = self.llm.bind(max_tokens=MEMORY_SUMMARY_MAX_TOKENS)
+        # Only the dialect name is needed; SQLDatabase would reflect every table again
+        self.dialect = get_engine().dialect.name
+        # Built once per process and refreshed on an interval; its version keys the SQL cache
+        self.catalog = get_schema_catalog().ensure_fresh()
+        self.sql_cache = get_sql_cache()
+        self.prompt_builder = PromptBuilder(self.catalog, self.dialect)
+        self.results = get_result_store()
+        # Used from the executor's event loop only (see core/chat_executor.py)
+        self.llm_limit = asyncio.Semaphore(LLM_CONCURRENCY)
+        self.db_limit = asyncio.Semaphore(DB_CONCURRENCY)
+        self.graph = self.build_graph()
+        self.startup_seconds = time.perf_counter() - started
+
+    def build_graph(self, checkpointer=None):
+        # The executor compiles its own copy with a checkpointer bound to its event loop
+        graph_builder = StateGraph(State)
+        graph_builder.add_node("contextualize", instrument("contextualize", self.contextualize))
+        graph_builder.add_node("filter_result", instrument("filter_result", self.filter_result))
+        graph_builder.add_node("check_cache", instrument("check_cache", self.check_cache))
+        graph_builder.add_node("write_query", instrument("write_query", self.write_query))
+        graph_builder.add_node("guard_query", instrument("guard_query", self.guard_query))
+        graph_builder.add_node("execute_query", instrument("execute_query", self.execute_query))
+        graph_builder.add_node("repair_query", instrument("repair_query", self.repair_query))
+        graph_builder.add_node("generate_answer", instrument("generate_answer", self.generate_answer))
+        graph_builder.add_node("remember", instrument("remember", self.remember))
+        graph_builder.add_edge(START, "contextualize")
+        graph_builder.add_conditional_edges("contextualize", self.route_after_contextualize, ["filter_result", "check_cache"])
+        graph_builder.add_conditional_edges("filter_result", self.route_after_filter, ["generate_answer", "check_cache"])
+        graph_builder.add_conditional_edges("check_cache", self.route_after_cache, ["write_query", "guard_query"])
+        graph_builder.add_edge("write_query", "guard_query")
+        graph_builder.add_conditional_edges("guard_query", self.route_after_guard, ["execute_query", "repair_query", END])
+        graph_builder.add_conditional_edges("execute_query", self.route_after_execute, ["generate_answer", "repair_query", END])
+        graph_builder.add_conditional_edges("repair_query", self.route_after_repair, ["guard_query", END])
+        graph_builder.add_edge("generate_answer", "remember")
+        graph_builder.add_edge("remember", END)
+        return graph_builder.compile(checkpointer=checkpointer)
+
+    @staticmethod
+    def turn_input(question):
+        # Graph input for a new question; clears what the previous turn left in the checkpoint
+        return {
+            "question": question, "query": "", "result": "", "result_id": "", "answer": "",
+            "cache_hit": "", "estimated_cost": 0.0, "row_count": 0, "row_limit": 0, "prompt_tokens": 0,
+            "cached_tokens": 0, "error": "", "repairs": [], "filters": [],
+        }
+
+    # Resolve follow-ups against the conversation so far
+    async def contextualize(self, state: State):
+        history = state.get("history", [])
+        if not history:
+            return {}
+        last = history[-1]
+        prompt = followup_prompt_template.format(
+            history=render_history(state.get("summary", ""), history),
+            columns=", ".join(last.get("columns", [])) or "none",
+            input=state["question"],
+        )
+        try:
+            async with self.llm_limit:
+                result = await self.followup_llm.ainvoke(prompt)
+        except Exception:
+            # Without a rewrite the question is handled as a new one
+            return {}
+        # A result that reached its query's TOP (the rules ask for one) or the row cap may be
+        # missing rows, so it is only reused when complete
+        reusable = last.get("result_id") and last.get("row_count", 0) < last.get("row_limit", 0)
+        filters = (result.get("filters") or []) if result.get("filter_only") and reusable else []
+        return {"question": result.get("question") or state["question"], "filters": filters}
+
+    def route_after_contextualize(self, state: State):
+        return "filter_result" if state.get("filters") else "check_cache"
+
+    # Answer a filter-only follow-up from the previous result instead of the database
+    async def filter_result(self, state: State):
+        last = state["history"][-1]
+        try:
+            previous = await asyncio.to_thread(self.results.load, last["result_id"])
+            if previous is None:
+                raise ValueError("the previous result has expired")
+            data = apply_filters(previous, state["filters"])
+            result_id = await asyncio.to_thread(self.results.save, data)
+        except Exception:
+            # Fall back to writing a new query for the standalone question
+            return {"filters": []}
+        query = f"{last['query']}\n-- then filtered: {describe_filters(state['filters'])}"
+        # A subset of a complete result is complete too
+        return {"query": query, "result": summarize_result(data), "result_id": result_id, "row_count": len(data),
+                "row_limit": last.get("row_limit", 0)}
+
+    def route_after_filter(self, state: State):
+        return "generate_answer" if state.get("result_id") else "check_cache"
+
+    # Reuse SQL generated for the same or a near-identical question
+    async def check_cache(self, state: State):
+        try:
+            query, cache_hit = await asyncio.to_thread(self.lookup_cached_query, state["question"])
+        except Exception:
+            # e.g. the schema catalog could not be refreshed; write_query reports that itself
+            return {"cache_hit": ""}
+        if query:
+            return {"query": query, "cache_hit": cache_hit}
+        return {"cache_hit": ""}
+
+    def route_after_cache(self, state: State):
+        return "guard_query" if state.get("cache_hit") else "write_query"
+
+    def lookup_cached_query(self, question):
+        return self.sql_cache.lookup(question, self.catalog.ensure_fresh().version)
+
+    # Query generation
+    async def write_query(self, state: State):
+        try:
+            await asyncio.to_thread(self.catalog.ensure_fresh)
+            messages, prompt_tokens = await asyncio.to_thread(self.prompt_builder.build, state["question"])
+            async with self.llm_limit:
+                result = await self.structured_llm.ainvoke(messages)
+            if result["parsed"] is None:
+                raise ValueError(result["parsing_error"] or "no query in response")
+            usage = result["raw"].usage_metadata or {}
+            return {
+                "query": result["parsed"]["query"],
+                "prompt_tokens": usage.get("input_tokens", prompt_tokens),
+                "cached_tokens": (usage.get("input_token_details") or {}).get("cache_read", 0),
+            }
+        except Exception as e:
+            return {"query": "", "error": f"Error generating query: {e}"}
+
+    # Read-only check, row cap and plan-cost budget before anything runs
+    async def guard_query(self, state: State):
+        try:
+            started = time.perf_counter()
+            try:
+                query, cost = await self.run_db(guard_query, state.get("query", ""))
+            finally:
+                annotate(db_ms=(time.perf_counter() - started) * 1000)
+            return {"query": query, "estimated_cost": cost, "row_limit": row_limit(state["query"])}
+        except GuardError as e:
+            await self.evict_cached_query(state)
+            return {"error": str(e)}
+        except Exception as e:
+            await self.evict_cached_query(state)
+            return {"error": f"Error checking query: {e}"}
+
+    async def evict_cached_query(self, state: State):
+        # A cached query that fails is dropped instead of being served again until it expires.
+        # The cache holds guarded queries, which the guard returns unchanged.
+        if state.get("cache_hit"):
+            await asyncio.to_thread(self.sql_cache.evict, state["query"])
+
+    def route_after_guard(self, state: State):
+        return self.route_failure(state) if state.get("error") else "execute_query"
+
+    def route_after_execute(self, state: State):
+        return self.route_failure(state) if state.get("error") else "generate_answer"
+
+    # Send a rejected or failed query to repair while attempts remain
+    def route_failure(self, state: State):
+        if state.get("query") and len(state.get("repairs", [])) < REPAIR_MAX_ATTEMPTS:
+            return "repair_query"
+        return END
+
+    def route_after_repair(self, state: State):
+        return END if state.get("error") else "guard_query"
+
+    async def repair_query(self, state: State):
+        repairs = state.get("repairs", []) + [{"query": state["query"], "error": state["error"]}]
+        prompt = repair_prompt_template.format(
+            dialect=self.dialect,
+            input=state["question"],
+            query=state["query"],
+            error=state["error"][:1000],
+            table_info=self.catalog.table_info(state["question"], max_tables=3),
+        )
+        try:
+            async with self.llm_limit:
+                result = await self.repair_llm.ainvoke(prompt)
+            # A repaired query is new SQL, so it is cached once it runs
+            return {"query": result["query"], "error": "", "cache_hit": "", "repairs": repairs}
+        except Exception as e:
+            return {"error": f"Error repairing query: {e}", "repairs": repairs}
+
+    # Query execution
+    async def execute_query(self, state: State):
+        try:
+            data = await self.run_db(self.run_sql, state["query"])
+            # Only cache freshly generated queries that actually ran
+            if not state.get("cache_hit"):
+                await asyncio.to_thread(self.sql_cache.store, state["question"], state["query"], self.catalog.version)
+            if state.get("repairs"):
+                await asyncio.to_thread(log_repair, state)
+            # The full frame is stored for display and follow-ups; only a bounded summary goes to the LLM
+            result_id = await asyncio.to_thread(self.results.save, data)
+            return {"result": summarize_result(data), "result_id": result_id, "row_count": len(data)}
+        except Exception as e:
+            await self.evict_cached_query(state)
+            return {"result": "", "error": f"Error executing query: {e}"}
+
+    async def run_db(self, func, *args):
+        # Run blocking database work in a thread under a db_limit slot. A cancelled or
+        # timed-out request cannot stop the thread, so the slot is only released once
+        # the thread is done (statements are bounded server-side by QUERY_TIMEOUT).
+        await self.db_limit.acquire()
+        work = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        work.add_done_callback(self._release_db_slot)
+        return await asyncio.shield(work)
+
+    def _release_db_slot(self, work):
+        self.db_limit.release()
+        # Mark a failure as seen when nobody is left awaiting the result
+        if not work.cancelled():
+            work.exception()
+
+    def run_sql(self, query):
+        started = time.perf_counter()
+        try:
+            data = fetch_frame(query, name="chatbot query", timeout=QUERY_TIMEOUT)
+            return data.set_axis(unique_columns(data.columns), axis=1)
+        finally:
+            annotate(db_ms=(time.perf_counter() - started) * 1000)
+
+    # Answer generation
+    async def generate_answer(self, state: State):
+        prompt = (
+            "Given the following user question, corresponding SQL query, "
+            "and SQL result, answer the user question. If the result is empty, tell the user that the sql query returned empty result\n\n"
+            f'Question: {state["question"]}\n'
+            f'SQL Query: {state["query"]}\n'
+            f'SQL Result: {state["result"]}'
+        )
+        try:
+            async with self.llm_limit:
+                response = await self.answer_llm.ainvoke(prompt)
+            return {"answer": response.content}
+        except Exception as e:
+            return {"answer": "", "error": f"Error generating answer: {e}"}
+
+    # Add the answered turn to the conversation, folding the oldest turns into the summary
+    async def remember(self, state: State):
+        if not state.get("answer"):
+            return {}
+        result = await asyncio.to_thread(self.results.load, state["result_id"]) if state.get("result_id") else None
+        history = state.get("history", []) + [{
+            "question": state["question"],
+            "query": state["query"],
+            "answer": state["answer"],
+            "result_id": state.get("result_id", ""),
+            "columns": [str(column) for column in result.columns] if result is not None else [],
+            "row_count": state.get("row_count", 0),
+            "row_limit": state.get("row_limit", 0),
+        }]
+        if len(history) <= MEMORY_TURNS:
+            return {"history": history}
+        older, history = history[:-MEMORY_TURNS], history[-MEMORY_TURNS:]
+        summary = state.get("summary", "")
+        prompt = summary_prompt_template.format(summary=summary or "(none)", turns=render_history("", older))
+        try:
+            async with self.llm_limit:
+                response = await self.summary_llm.ainvoke(prompt)
+            summary = response.content
+        except Exception:
+            # Keep the previous summary; the dropped turns are lost rather than growing the prompt
+            pass
+        return {"history": history, "summary": summary}
+
+
+def log_repair(state):
+    path = Path(REPAIR_LOG)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    record = {
+        "time": time.time(),
+        "question": state["question"],
+        "attempts": state["repairs"],
+        "query": state["query"],
+    }
+    with path.open("a", encoding="utf-8") as log:
+        log.write(json.dumps(record) + "\n")
+
+
+@st.cache_resource
+def get_chatbot_service():
+    return ChatbotService()
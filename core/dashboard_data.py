@@ -0,0 +1,278 @@
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+from core.fetch import DateTime, Float, Int, String, fetch_frame
+from core.kpis import compute_tiles, fetch_kpi_delta, merge_kpi_delta
+from core.query_cache import get_query_cache
+from core.snapshots import Snapshot
+
+# Per-query cache lifetimes, in seconds
+ASSET_QUERY_TTL = 600
+SPEND_QUERY_TTL = 900
+
+# Monthly Actual vs. Budget totals, aggregated on the server. The optional
+# date range is half-open: start_date <= date < end_date.
+monthly_spend_query = text("""
+SELECT
+    DATEFROMPARTS(YEAR(dc.date), MONTH(dc.date), 1) AS month_start,
+    SUM(cs.actual_cost) AS actual_cost,
+    SUM(cs.budget_cost) AS budget_cost
+FROM
+    sc_stg.dim_calendar dc
+INNER JOIN
+    sc_stg.cost_savings cs
+ON
+    dc.date = cs.savings_date
+WHERE
+    (:start_date IS NULL OR dc.date >= :start_date)
+    AND (:end_date IS NULL OR dc.date < :end_date)
+GROUP BY
+    DATEFROMPARTS(YEAR(dc.date), MONTH(dc.date), 1)
+ORDER BY
+    month_start ASC
+""")
+
+
+# Rows per asset table page offered on the dashboard; the first is the default
+ASSET_PAGE_SIZES = [25, 50, 100, 250]
+
+# Columns the asset table can be sorted by, with the value NULLs sort as
+ASSET_SORT_COLUMNS = {
+    "last_maintenance_date": "CAST('19000101' AS date)",
+    "asset_name": "''",
+    "utilization_rate": "0",
+    "asset_turnover_rate": "0",
+    "usage_hours": "0",
+}
+
+
+def asset_page_query(sort_column, descending):
+    # Keyset pagination over (sort_key, asset_name): each page starts strictly
+    # after the last row of the previous one, so no OFFSET scan is needed.
+    if sort_column not in ASSET_SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort column: {sort_column}")
+    direction = "DESC" if descending else "ASC"
+    comparison = "<" if descending else ">"
+    return text(f"""
+    WITH assets AS (
+        SELECT
+            asset_name,
+            AVG(asset_turnover_rate) AS asset_turnover_rate,
+            AVG(utilization_rate) AS utilization_rate,
+            MAX(last_maintenance_date) AS last_maintenance_date,
+            AVG(usage_hours) AS usage_hours
+        FROM
+            sc_stg.asset_utilization
+        WHERE
+            (:name_filter IS NULL OR asset_name LIKE :name_filter)
+        GROUP BY
+            asset_name
+    ), keyed AS (
+        SELECT *, COALESCE({sort_column}, {ASSET_SORT_COLUMNS[sort_column]}) AS sort_key
+        FROM assets
+    )
+    SELECT TOP (:limit)
+        asset_name, asset_turnover_rate, utilization_rate, last_maintenance_date, usage_hours, sort_key
+    FROM
+        keyed
+    WHERE
+        :after_key IS NULL
+        OR sort_key {comparison} :after_key
+        OR (sort_key = :after_key AND asset_name {comparison} :after_name)
+    ORDER BY
+        sort_key {direction}, asset_name {direction}
+    """)
+
+
+# Snapshot deltas. Each returns rows changed after the :after watermark (all
+# rows when NULL) plus a "watermark" column with the newest source date seen.
+
+# Per-asset, per-day sums and counts, so averages can be combined across days.
+# last_maintenance_date has day granularity, so the watermark's own day is
+# queried again and its groups replace the stored ones; rows added to that day
+# after the last refresh are picked up without counting the others twice.
+asset_delta_query = text("""
+SELECT
+    asset_name,
+    CAST(last_maintenance_date AS date) AS maintenance_day,
+    SUM(asset_turnover_rate) AS asset_turnover_rate_sum,
+    COUNT(asset_turnover_rate) AS asset_turnover_rate_count,
+    SUM(utilization_rate) AS utilization_rate_sum,
+    COUNT(utilization_rate) AS utilization_rate_count,
+    SUM(usage_hours) AS usage_hours_sum,
+    COUNT(usage_hours) AS usage_hours_count,
+    MAX(last_maintenance_date) AS last_maintenance_date,
+    MAX(last_maintenance_date) AS watermark
+FROM
+    sc_stg.asset_utilization
+WHERE
+    :after IS NULL OR last_maintenance_date >= CAST(:after AS date)
+GROUP BY
+    asset_name,
+    CAST(last_maintenance_date AS date)
+""")
+
+# Monthly totals from the watermark's month onwards; that month is recomputed
+# in full so days added to it are not double counted.
+spend_delta_query = text("""
+SELECT
+    DATEFROMPARTS(YEAR(dc.date), MONTH(dc.date), 1) AS month_start,
+    SUM(cs.actual_cost) AS actual_cost,
+    SUM(cs.budget_cost) AS budget_cost,
+    MAX(cs.savings_date) AS watermark
+FROM
+    sc_stg.dim_calendar dc
+INNER JOIN
+    sc_stg.cost_savings cs
+ON
+    dc.date = cs.savings_date
+WHERE
+    :after IS NULL OR dc.date >= DATEFROMPARTS(YEAR(:after), MONTH(:after), 1)
+GROUP BY
+    DATEFROMPARTS(YEAR(dc.date), MONTH(dc.date), 1)
+""")
+
+ASSET_MEASURES = ['asset_turnover_rate', 'utilization_rate', 'usage_hours']
+
+
+# Result column types, with NULL measures read as 0 as the dashboard always has
+asset_columns = {
+    "asset_name": String(),
+    "asset_turnover_rate": Float(0),
+    "utilization_rate": Float(0),
+    "usage_hours": Float(0),
+    "last_maintenance_date": DateTime(),
+}
+asset_delta_columns = {
+    "asset_name": String(),
+    "maintenance_day": DateTime(),
+    **{f"{measure}_sum": Float(0) for measure in ASSET_MEASURES},
+    **{f"{measure}_count": Int(0) for measure in ASSET_MEASURES},
+    "last_maintenance_date": DateTime(),
+    "watermark": DateTime(),
+}
+spend_columns = {
+    "month_start": DateTime(),
+    "actual_cost": Float(0),
+    "budget_cost": Float(0),
+    "watermark": DateTime(),
+}
+
+
+def _watermark_param(watermark):
+    return watermark.to_pydatetime() if watermark is not None else None
+
+
+def fetch_asset_delta(watermark):
+    params = {"after": _watermark_param(watermark)}
+    return fetch_frame(asset_delta_query, params, asset_delta_columns, name="asset utilization delta")
+
+
+def merge_asset_delta(snapshot, delta):
+    # The delta covers every day from the watermark's onwards; those days are replaced
+    if delta.empty:
+        return snapshot
+    kept = snapshot[~(snapshot['maintenance_day'] >= delta['maintenance_day'].min())]
+    return pd.concat([kept, delta.drop(columns='watermark')], ignore_index=True)
+
+
+def fetch_spend_delta(watermark):
+    params = {"after": _watermark_param(watermark)}
+    return fetch_frame(spend_delta_query, params, spend_columns, name="monthly spend delta")
+
+
+def merge_spend_delta(snapshot, delta):
+    if delta.empty:
+        return snapshot
+    kept = snapshot[snapshot['month_start'] < delta['month_start'].min()]
+    return pd.concat([kept, delta.drop(columns='watermark')], ignore_index=True)
+
+
+@st.cache_resource
+def get_snapshots():
+    return {
+        "assets": Snapshot("asset_utilization_daily", fetch_asset_delta, merge_asset_delta),
+        "spend": Snapshot("monthly_spend", fetch_spend_delta, merge_spend_delta),
+        "kpis": Snapshot("kpi_rollups", fetch_kpi_delta, merge_kpi_delta),
+    }
+
+
+@st.cache_resource
+def _kpi_tiles():
+    # Computed tiles, keyed by the refresh time of the rollup they came from
+    return {}
+
+
+def refresh_snapshots(full=False, if_stale=False):
+    for snapshot in get_snapshots().values():
+        snapshot.refresh(full=full, if_stale=if_stale)
+
+
+def load_assets():
+    daily = get_snapshots()["assets"].get()
+    aggregations = {column: 'sum' for column in daily.columns if column.endswith(('_sum', '_count'))}
+    aggregations['last_maintenance_date'] = 'max'
+    df = daily.groupby('asset_name', as_index=False).agg(aggregations)
+    df_assets = df[['asset_name', 'last_maintenance_date']].copy()
+    for measure in ASSET_MEASURES:
+        counts = df[f'{measure}_count']
+        df_assets[measure] = (df[f'{measure}_sum'] / counts.where(counts > 0)).fillna(0)
+    df_assets = df_assets.sort_values('last_maintenance_date', kind='stable').reset_index(drop=True)
+    return df_assets[['asset_name', 'asset_turnover_rate', 'utilization_rate', 'last_maintenance_date', 'usage_hours']]
+
+
+def load_kpis():
+    # KPI tiles from the precomputed monthly rollups; recomputed only after the rollups refresh
+    snapshot = get_snapshots()["kpis"]
+    rollup = snapshot.get()
+    served = _kpi_tiles()
+    if served.get("refreshed_at") != snapshot.refreshed_at:
+        served["tiles"] = compute_tiles(rollup, snapshot.watermark)
+        served["refreshed_at"] = snapshot.refreshed_at
+    return served["tiles"]
+
+
+def load_monthly_spend(start_date=None, end_date=None):
+    # One row per month, indexed by a monthly PeriodIndex. The unfiltered series
+    # comes from the incremental snapshot; a date range is queried directly.
+    if start_date is None and end_date is None:
+        df = get_snapshots()["spend"].get().sort_values('month_start').copy()
+    else:
+        params = {"start_date": start_date, "end_date": end_date}
+        df = get_query_cache().fetch(
+            monthly_spend_query.text,
+            lambda: fetch_frame(monthly_spend_query, params, spend_columns, name="monthly spend"),
+            params=params,
+            ttl=SPEND_QUERY_TTL,
+        ).copy()
+    return df.set_index(pd.PeriodIndex(df.pop('month_start'), freq='M', name='month'))
+
+
+def load_asset_page(page_size, sort_column="last_maintenance_date", descending=False, name_filter=None, after=None):
+    # Returns (rows, next_cursor); next_cursor is None on the last page.
+    # `after` is the cursor returned for the previous page.
+    query = asset_page_query(sort_column, descending)
+    after_key, after_name = after if after else (None, None)
+    params = {
+        "name_filter": f"%{name_filter}%" if name_filter else None,
+        "after_key": after_key,
+        "after_name": after_name,
+        # One extra row tells us whether another page exists
+        "limit": page_size + 1,
+    }
+    df = get_query_cache().fetch(
+        query.text,
+        lambda: fetch_frame(query, params, asset_columns, name="asset table page"),
+        params=params,
+        ttl=ASSET_QUERY_TTL,
+    ).copy()
+
+    next_cursor = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        last = df.iloc[-1]
+        sort_key = last['sort_key']
+        next_cursor = (sort_key.item() if hasattr(sort_key, 'item') else sort_key, last['asset_name'])
+    df = df.drop(columns='sort_key')
+    return df.reset_index(drop=True), next_cursor
@@ -0,0 +1,105 @@
+import os
+import struct
+import threading
+import time
+import urllib
+from itertools import chain, repeat
+
+import sqlalchemy as sa
+import streamlit as st
+from azure.identity import ClientSecretCredential
+from dotenv import load_dotenv
+
+load_dotenv()
+
+resource_url = "https://database.windows.net/.default"
+
+# pyodbc connection attribute used to pass an AAD access token to the ODBC driver
+SQL_COPT_SS_ACCESS_TOKEN = 1256
+
+# Pool settings, overridable from .env
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+# SQLAlchemy URL of a database to use instead of Azure SQL (e.g. a local benchmark database)
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Refresh the AAD token this many seconds before it actually expires
+TOKEN_REFRESH_MARGIN = int(os.getenv("DB_TOKEN_REFRESH_MARGIN", 300))
+
+
+class TokenProvider:
+    # Holds the current access token and fetches a new one shortly before expiry
+    def __init__(self, credential, scope=resource_url, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self._credential = credential
+        self._scope = scope
+        self._refresh_margin = refresh_margin
+        self._token = None
+        self._lock = threading.Lock()
+
+    def get_token(self):
+        with self._lock:
+            if self._token is None or self._token.expires_on - time.time() < self._refresh_margin:
+                self._token = self._credential.get_token(self._scope)
+            return self._token.token
+
+
+def encode_token(token):
+    # The ODBC driver expects the token as length-prefixed UTF-16-LE bytes
+    token_as_bytes = bytes(token, "UTF-8")
+    encoded_bytes = bytes(chain.from_iterable(zip(token_as_bytes, repeat(0))))
+    return struct.pack("<i", len(encoded_bytes)) + encoded_bytes
+
+
+@st.cache_resource
+def get_credential():
+    return ClientSecretCredential(
+        tenant_id=os.getenv("TENANT_ID"),
+        client_id=os.getenv("CLIENT_ID"),
+        client_secret=os.getenv("CLIENT_SECRET"),
+    )
+
+
+@st.cache_resource
+def get_token_provider():
+    return TokenProvider(get_credential())
+
+
+@st.cache_resource
+def get_engine():
+    if DATABASE_URL:
+        return sa.create_engine(DATABASE_URL)
+
+    sql_endpoint = os.getenv("sql_endpoint")
+    database = os.getenv("database")
+    connection_string = f"Driver={{ODBC Driver 18 for SQL Server}};Server={sql_endpoint},1433;Database={database};Encrypt=Yes;TrustServerCertificate=No"
+    params = urllib.parse.quote(connection_string)
+
+    engine = sa.create_engine(
+        "mssql+pyodbc:///?odbc_connect={0}".format(params),
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+    token_provider = get_token_provider()
+
+    # Inject a fresh token for every new physical connection the pool opens
+    @sa.event.listens_for(engine, "do_connect")
+    def provide_token(dialect, conn_rec, cargs, cparams):
+        cparams["attrs_before"] = {SQL_COPT_SS_ACCESS_TOKEN: encode_token(token_provider.get_token())}
+
+    return engine
+
+
+def pool_status():
+    engine = get_engine()
+    return {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "recycle": POOL_RECYCLE,
+        "status": engine.pool.status(),
+    }
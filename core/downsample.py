@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Points kept per horizontal pixel of chart width
+POINTS_PER_PIXEL = float(os.getenv("CHART_POINTS_PER_PIXEL", 1.0))
+# Traces with more points than this are drawn with WebGL
+WEBGL_THRESHOLD = int(os.getenv("CHART_WEBGL_THRESHOLD", 5000))
+MIN_POINTS = 3
+
+
+def target_points(width_px, points_per_pixel=POINTS_PER_PIXEL):
+    return max(MIN_POINTS, int(width_px * points_per_pixel))
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(float)
+    return values.astype(float)
+
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the visual shape
+    n = len(x)
+    if threshold >= n or threshold < MIN_POINTS:
+        return np.arange(n)
+    xf, yf = _as_float(x), _as_float(y)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xf[end:next_end].mean()
+        avg_y = yf[end:next_end].mean()
+        area = np.abs((xf[a] - avg_x) * (yf[start:end] - yf[a]) - (xf[a] - xf[start:end]) * (avg_y - yf[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(x, y, threshold):
+    # Keep the minimum and maximum of each bucket; cheaper than LTTB and preserves spikes
+    n = len(x)
+    if threshold >= n or threshold < MIN_POINTS:
+        return np.arange(n)
+    yf = _as_float(y)
+    edges = np.linspace(0, n, threshold // 2 + 1).astype(int)
+    selected = set()
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            selected.add(start + int(np.argmin(yf[start:end])))
+            selected.add(start + int(np.argmax(yf[start:end])))
+    return np.array(sorted(selected | {0, n - 1}))
+
+
+def full_resolution(x, y, threshold):
+    return np.arange(len(x))
+
+
+METHODS = {"lttb": lttb, "minmax": minmax, "none": full_resolution}
+
+
+def area_trace(x, y, width_px, method="lttb", x_range=None, **trace_kwargs):
+    # Build a Scatter (or Scattergl for large inputs) trace from full-resolution data,
+    # downsampled for the given chart width. x_range=(lo, hi) zooms into the full data first.
+    x, y = np.asarray(x), np.asarray(y)
+    if x_range is not None:
+        mask = (x >= x_range[0]) & (x <= x_range[1])
+        x, y = x[mask], y[mask]
+    indexes = METHODS[method](x, y, target_points(width_px))
+    trace_type = go.Scattergl if len(x) > WEBGL_THRESHOLD else go.Scatter
+    return trace_type(x=x[indexes], y=y[indexes], **trace_kwargs)
+
+
+def payload_bytes(fig):
+    return len(fig.to_json().encode("utf-8"))
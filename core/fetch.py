@@ -0,0 +1,175 @@
+import datetime
+import os
+import threading
+import time
+import tracemalloc
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from core.db import get_engine
+
+load_dotenv()
+
+# Rows pulled from the driver per batch
+FETCH_CHUNK_SIZE = int(os.getenv("FETCH_CHUNK_SIZE", 10000))
+# Measure peak Python heap usage with tracemalloc; slows fetching, so off by default
+FETCH_TRACE_MEMORY = os.getenv("FETCH_TRACE_MEMORY", "").lower() in ("1", "true", "yes")
+
+
+class Column:
+    # Declared type of a result column and the value NULLs become (None keeps them as NaN/NaT)
+    def __init__(self, dtype, fill=None):
+        self.dtype = dtype
+        self.fill = fill
+
+
+def Float(fill=None):
+    return Column("float64", fill)
+
+
+def Int(fill=0):
+    return Column("int64", fill)
+
+
+def DateTime():
+    return Column("datetime64[ns]")
+
+
+def String():
+    return Column("object")
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def fetch_stats():
+    # Latest statistics per named fetch
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _infer(values):
+    # Declaration for an undeclared column, from its first non-NULL value; None while
+    # every value seen is NULL. Decided once so that all chunks share one dtype.
+    first = next((value for value in values if value is not None), None)
+    if first is None:
+        return None
+    if isinstance(first, bool):
+        return String()
+    if isinstance(first, (int, np.integer)):
+        return Column("int64")
+    if isinstance(first, (float, Decimal, np.floating)):
+        return Float()
+    if isinstance(first, (datetime.date, datetime.datetime)):
+        return DateTime()
+    return String()
+
+
+def _convert(values, column):
+    if column.dtype.startswith("datetime64"):
+        array = pd.to_datetime(pd.Series(values, dtype=object)).to_numpy(dtype=column.dtype)
+        if column.fill is not None:
+            array[np.isnat(array)] = np.datetime64(column.fill)
+        return array
+    if column.dtype == "object":
+        array = np.array(values, dtype=object)
+        if column.fill is not None:
+            array[array == None] = column.fill  # noqa: E711
+        return array
+    if column.dtype == "int64":
+        if column.fill is not None:
+            values = [column.fill if value is None else value for value in values]
+        if not any(value is None for value in values):
+            # Straight to int64: going through float64 loses precision past 2**53
+            return np.array(values, dtype="int64")
+    # np.array(..., dtype=float) maps None to NaN and converts Decimal
+    array = np.array(values, dtype="float64")
+    if column.fill is not None:
+        array[np.isnan(array)] = column.fill
+    elif np.isnan(array).any():
+        # Integers with NULLs and no fill stay float64, as pandas would have them
+        return array
+    return array.astype(column.dtype)
+
+
+def fetch_frame(query, params=None, schema=None, name=None, chunk_size=FETCH_CHUNK_SIZE, engine=None, timeout=None):
+    # Stream a query in chunks straight into typed numpy columns and return a DataFrame.
+    # `query` is a SQLAlchemy text() clause or a raw SQL string (run without bind parsing).
+    # `schema` maps column names to Column declarations; others are inferred.
+    # `timeout` sets the driver's query timeout in seconds for this call.
+    schema = schema or {}
+    tracing = FETCH_TRACE_MEMORY and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    started = time.perf_counter()
+    chunks = None
+    rows = 0
+    buffered = 0
+    peak_buffered = 0
+    try:
+        with (engine or get_engine()).connect() as connection:
+            dbapi_connection = connection.connection.dbapi_connection
+            previous_timeout = getattr(dbapi_connection, "timeout", None)
+            set_timeout = timeout is not None and previous_timeout is not None
+            if set_timeout:
+                dbapi_connection.timeout = timeout
+            try:
+                connection = connection.execution_options(yield_per=chunk_size)
+                if isinstance(query, str):
+                    result = connection.exec_driver_sql(query, tuple(params) if params else ())
+                else:
+                    result = connection.execute(query, params or {})
+                # Buffers are kept by position: result column names need not be unique
+                # (SQL Server names every unaliased expression '')
+                columns = list(result.keys())
+                chunks = [[] for _ in columns]
+                declared = [schema.get(column) for column in columns]
+                # Values of undeclared columns that have only been NULL so far
+                pending = [[] for _ in columns]
+                for partition in result.partitions():
+                    rows += len(partition)
+                    for position, values in enumerate(zip(*partition)):
+                        values = list(values)
+                        if declared[position] is None:
+                            inferred = _infer(values)
+                            if inferred is None:
+                                pending[position].extend(values)
+                                continue
+                            declared[position] = inferred
+                            values = pending[position] + values
+                            pending[position] = []
+                        array = _convert(values, declared[position])
+                        chunks[position].append(array)
+                        buffered += array.nbytes
+                    peak_buffered = max(peak_buffered, buffered)
+            finally:
+                # The connection goes back to the pool; don't leak this call's timeout
+                if set_timeout:
+                    dbapi_connection.timeout = previous_timeout
+        # Columns that were NULL throughout (or had no rows) come back as object
+        data = [
+            np.concatenate(arrays) if arrays else _convert(pending[position], declared[position] or String())
+            for position, arrays in enumerate(chunks)
+        ]
+        df = pd.DataFrame(dict(enumerate(data)))
+        df.columns = columns
+    finally:
+        peak_traced = tracemalloc.get_traced_memory()[1] if tracing else None
+        if tracing:
+            tracemalloc.stop()
+
+    seconds = time.perf_counter() - started
+    if name:
+        with _stats_lock:
+            _stats[name] = {
+                "rows": rows,
+                "seconds": seconds,
+                "rows_per_second": rows / seconds if seconds else float("inf"),
+                # Bytes held in column buffers; the traced Python heap peak when FETCH_TRACE_MEMORY is on
+                "peak_bytes": peak_traced if peak_traced is not None else peak_buffered,
+            }
+    return df
@@ -0,0 +1,121 @@
+import pandas as pd
+from sqlalchemy import text
+
+from core.fetch import DateTime, Float, Int, fetch_frame
+
+
+class Kpi:
+    # A dashboard metric defined once: a per-row SQL expression over
+    # sc_stg.asset_utilization and how rows combine ("sum" or "avg").
+    def __init__(self, key, label, expression, aggregate, fmt):
+        self.key = key
+        self.label = label
+        self.expression = expression
+        self.aggregate = aggregate
+        self.fmt = fmt
+
+
+def compact(value):
+    for threshold, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if abs(value) >= threshold:
+            return f"{value / threshold:.2f}{suffix}"
+    return f"{value:.2f}"
+
+
+def two_decimals(value):
+    return f"{value:.2f}"
+
+
+KPIS = [
+    # Available hours are not stored; utilization_rate is usage as a percentage of them
+    Kpi("available_hours", "Total Available Hours",
+        "usage_hours * 100.0 / NULLIF(utilization_rate, 0)", "sum", compact),
+    Kpi("usage_hours", "Total Usage Hours", "usage_hours", "sum", compact),
+    Kpi("utilization_rate", "Avg Utilization Rate", "utilization_rate", "avg", two_decimals),
+    Kpi("asset_turnover_rate", "Avg Turnover Rate", "asset_turnover_rate", "avg", two_decimals),
+]
+
+
+def kpi_delta_query(kpis=KPIS):
+    # Every KPI in one scan, rolled up per month as sums and counts. Deltas start
+    # at the watermark's month, which is recomputed in full: the date column has
+    # day granularity, so rows can still arrive for the watermark's own day.
+    # Rows without a last_maintenance_date cannot be placed in a period and are left out.
+    measures = ",\n    ".join(
+        f"SUM({kpi.expression}) AS {kpi.key}_sum,\n    COUNT({kpi.expression}) AS {kpi.key}_count"
+        for kpi in kpis
+    )
+    return text(f"""
+SELECT
+    DATEFROMPARTS(YEAR(last_maintenance_date), MONTH(last_maintenance_date), 1) AS month_start,
+    {measures},
+    MAX(last_maintenance_date) AS watermark
+FROM
+    sc_stg.asset_utilization
+WHERE
+    last_maintenance_date IS NOT NULL
+    AND (:after IS NULL OR last_maintenance_date >= DATEFROMPARTS(YEAR(:after), MONTH(:after), 1))
+GROUP BY
+    DATEFROMPARTS(YEAR(last_maintenance_date), MONTH(last_maintenance_date), 1)
+""")
+
+
+kpi_columns = {
+    "month_start": DateTime(),
+    **{f"{kpi.key}_sum": Float(0) for kpi in KPIS},
+    **{f"{kpi.key}_count": Int(0) for kpi in KPIS},
+    "watermark": DateTime(),
+}
+
+
+def fetch_kpi_delta(watermark):
+    params = {"after": watermark.to_pydatetime() if watermark is not None else None}
+    return fetch_frame(kpi_delta_query(), params, kpi_columns, name="kpi rollup delta")
+
+
+def merge_kpi_delta(snapshot, delta):
+    # The delta's months replace the stored ones rather than adding to them
+    if delta.empty:
+        return snapshot
+    kept = snapshot[snapshot['month_start'] < delta['month_start'].min()]
+    return pd.concat([kept, delta.drop(columns='watermark')], ignore_index=True)
+
+
+def kpi_value(kpi, rollup):
+    total = rollup[f"{kpi.key}_sum"].sum()
+    if kpi.aggregate == "sum":
+        return float(total)
+    count = rollup[f"{kpi.key}_count"].sum()
+    return float(total / count) if count else 0.0
+
+
+def compute_tiles(rollup, through=None, kpis=KPIS):
+    # Every KPI for the latest complete month and its change from the month before.
+    # `through` is the latest date in the data; a month that ends after it is still
+    # filling up, so it is not compared with a full one.
+    # Returns (period label, [{"label", "value", "delta"}]).
+    if rollup.empty:
+        return None, [{"label": kpi.label, "value": "n/a", "delta": None} for kpi in kpis]
+    months = rollup.sort_values('month_start')
+    month_end = months['month_start'] + pd.offsets.MonthEnd(0)
+    complete = months[month_end <= through] if through is not None else months
+    partial = complete.empty
+    if partial:
+        # Not even one full month yet: the month so far, with nothing to compare against
+        complete = months
+    latest = complete.iloc[[-1]]
+    previous = complete.iloc[[-2]] if len(complete) > 1 and not partial else None
+    period = latest['month_start'].iloc[0].strftime('%b %Y')
+    if partial:
+        period += " to date"
+    tiles = []
+    for kpi in kpis:
+        value = kpi_value(kpi, latest)
+        delta = None
+        if previous is not None:
+            delta = kpi.fmt(value - kpi_value(kpi, previous))
+            delta = delta if delta.startswith("-") else f"+{delta}"
+        tiles.append({"label": f"{kpi.label} ({period})", "value": kpi.fmt(value), "delta": delta})
+    if previous is not None:
+        period += f" vs {previous['month_start'].iloc[0].strftime('%b %Y')}"
+    return period, tiles
@@ -0,0 +1,49 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import streamlit as st
+from dotenv import load_dotenv
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+load_dotenv()
+
+# Worker threads shared by all dashboard sessions; each holds at most one pooled connection
+LOADER_WORKERS = int(os.getenv("DASHBOARD_LOADER_WORKERS", 8))
+
+
+class LoadResult:
+    def __init__(self, name, value=None, error=None, seconds=0.0):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.seconds = seconds
+
+
+class DashboardLoader:
+    # Runs a page's independent data loaders concurrently and hands back each
+    # result as soon as it is ready, so sections can render in completion order.
+    def __init__(self, max_workers=LOADER_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dashboard-loader")
+
+    def run(self, loaders):
+        # loaders: {name: zero-argument callable}; yields LoadResult in completion order
+        ctx = get_script_run_ctx()
+        futures = {self._pool.submit(self._call, ctx, name, loader): name for name, loader in loaders.items()}
+        for future in as_completed(futures):
+            yield future.result()
+
+    @staticmethod
+    def _call(ctx, name, loader):
+        # Let st.cache_* calls made by the loader see the submitting session
+        add_script_run_ctx(ctx=ctx)
+        started = time.perf_counter()
+        try:
+            return LoadResult(name, value=loader(), seconds=time.perf_counter() - started)
+        except Exception as e:
+            return LoadResult(name, error=e, seconds=time.perf_counter() - started)
+
+
+@st.cache_resource
+def get_dashboard_loader():
+    return DashboardLoader()
@@ -0,0 +1,120 @@
+import logging
+import math
+import os
+import threading
+
+import streamlit as st
+import tiktoken
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage, SystemMessage
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the query-generation prompt, counted with the model's own tokenizer
+PROMPT_MAX_TOKENS = int(os.getenv("CHATBOT_PROMPT_MAX_TOKENS", 6000))
+PROMPT_MODEL = os.getenv("CHATBOT_PROMPT_MODEL", "gpt-4o")
+# "tiktoken", or "chars" for a network-free estimate of about four characters per token
+PROMPT_TOKENIZER = os.getenv("CHATBOT_PROMPT_TOKENIZER", "tiktoken")
+CHARS_PER_TOKEN = 4
+
+# Rules for writing the query. They only depend on the dialect, so every request
+# starts with the same text and the provider can serve it from its prompt cache.
+query_rules_template = '''
+Given an input question, create a syntactically correct {dialect} query in T-SQL format to help find the answer.
+Unless the user specifies a specific number of examples, limit your query to at most {top_k} results.
+Order the results by a relevant column to return the most interesting examples in the database.
+Ensure that the order by column appears in the select clause as well.
+
+## QUERY CONSTRUCTION RULES:
+1. Never query for all columns from a specific table; only select relevant columns for the question
+2. Do not use LIMIT clauses
+3. For all text filters:
+    - Make filters case-insensitive using COLLATE Latin1_General_CI_AI
+    - Use pattern matching with LIKE instead of exact matching or IN clauses
+    - Example: `BusinessUnit COLLATE Latin1_General_CI_AI LIKE '%textfilter%'`
+4. Empty results handling: If no data is found, make that clear in your response
+
+Use only the following tables:
+'''
+
+
+@st.cache_resource
+def get_encoding():
+    # None means token counts are estimated from the text length. tiktoken downloads
+    # its encoding on first use (cached under TIKTOKEN_CACHE_DIR), which can fail offline.
+    if PROMPT_TOKENIZER == "chars":
+        return None
+    try:
+        return tiktoken.encoding_for_model(PROMPT_MODEL)
+    except Exception as e:
+        logger.warning("Could not load the %s tokenizer, estimating token counts instead: %s", PROMPT_MODEL, e)
+        return None
+
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text, max_tokens):
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max(max_tokens, 0) * CHARS_PER_TOKEN]
+    return encoding.decode(encoding.encode(text)[:max(max_tokens, 0)])
+
+
+class PromptBuilder:
+    # Builds the query-generation prompt from most to least static: rules, then
+    # schema, then the question. The whole catalog is sent whenever it fits the
+    # budget, since that keeps the schema part of the prefix identical too; larger
+    # catalogs fall back to the tables most relevant to the question.
+    def __init__(self, catalog, dialect, top_k=100, max_tokens=PROMPT_MAX_TOKENS):
+        self.catalog = catalog
+        self.rules = query_rules_template.format(dialect=dialect, top_k=top_k)
+        self.max_tokens = max_tokens
+        self._full_schema = (None, "", 0)
+        self._lock = threading.Lock()
+
+    def full_schema(self):
+        # Rendered once per catalog version
+        with self._lock:
+            version, schema, tokens = self._full_schema
+            if version != self.catalog.version:
+                schema = "\n\n".join(self.catalog.tables[name].render() for name in sorted(self.catalog.tables))
+                tokens = count_tokens(schema)
+                self._full_schema = (self.catalog.version, schema, tokens)
+            return schema, tokens
+
+    def selected_schema(self, question, budget):
+        # Most relevant tables first, each only if it still fits; rendered in name
+        # order so questions that need the same tables share the same prefix
+        chosen = []
+        for table, columns in self.catalog.select(question):
+            rendered = table.render(columns)
+            tokens = count_tokens(rendered)
+            if tokens <= budget:
+                chosen.append((table.name, rendered))
+                budget -= tokens
+        if not chosen and self.catalog.tables:
+            # Not even the best match fits: send as much of it as the budget allows
+            table, columns = self.catalog.select(question, max_tables=1)[0]
+            return truncate_tokens(table.render(columns), budget)
+        return "\n\n".join(rendered for _, rendered in sorted(chosen))
+
+    def build(self, question):
+        # Returns (messages, prompt token count)
+        question_text = f"Question: {question}"
+        fixed_tokens = count_tokens(self.rules) + count_tokens(question_text)
+        schema, schema_tokens = self.full_schema()
+        if fixed_tokens + schema_tokens > self.max_tokens:
+            schema = self.selected_schema(question, self.max_tokens - fixed_tokens)
+            schema_tokens = count_tokens(schema)
+        messages = [
+            SystemMessage(self.rules + schema),
+            HumanMessage(question_text),
+        ]
+        return messages, fixed_tokens + schema_tokens
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Default time-to-live for a cached result, in seconds
+DEFAULT_TTL = int(os.getenv("QUERY_CACHE_TTL", 300))
+# Maximum number of results held in memory before the least recently used is evicted
+MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 64))
+# Optional directory for the on-disk Parquet tier; disabled when unset
+CACHE_DIR = os.getenv("QUERY_CACHE_DIR")
+
+
+def make_key(sql, params=None):
+    payload = json.dumps({"sql": " ".join(str(sql).split()), "params": params or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    def __init__(self, max_entries=MAX_ENTRIES, default_ttl=DEFAULT_TTL, cache_dir=CACHE_DIR):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # key -> (expires_at, DataFrame), ordered from least to most recently used
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # key -> {"lock", "waiters"} while a miss for it is being loaded, so concurrent
+        # misses for one key run loader() once and the others wait for its result
+        self._loading = {}
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def fetch(self, sql, loader, params=None, ttl=None):
+        # Return the cached result for sql/params, calling loader() to fill the cache on a miss
+        key = make_key(sql, params)
+        ttl = self.default_ttl if ttl is None else ttl
+
+        df = self._read_memory(key)
+        if df is not None:
+            return df
+
+        with self._lock:
+            flight = self._loading.setdefault(key, {"lock": threading.Lock(), "waiters": 0})
+            flight["waiters"] += 1
+        try:
+            with flight["lock"]:
+                # Filled by the caller this one waited for
+                df = self._read_memory(key)
+                if df is not None:
+                    return df
+
+                now = time.time()
+                entry = self._read_disk(key, now)
+                if entry is not None:
+                    with self._lock:
+                        self.stats["disk_hits"] += 1
+                    self._store(key, entry[1], entry[0], persist=False)
+                    return entry[1]
+
+                with self._lock:
+                    self.stats["misses"] += 1
+                df = loader()
+                self._store(key, df, now + ttl)
+                return df
+        finally:
+            with self._lock:
+                flight["waiters"] -= 1
+                if not flight["waiters"]:
+                    del self._loading[key]
+
+    def invalidate(self, sql=None, params=None):
+        # Drop a single result, or everything when no sql is given
+        with self._lock:
+            if sql is None:
+                keys = list(self._entries)
+                self._entries.clear()
+            else:
+                keys = [make_key(sql, params)]
+                self._entries.pop(keys[0], None)
+        if self.cache_dir:
+            paths = self.cache_dir.glob("*.parquet") if sql is None else [self._path(k) for k in keys]
+            for path in paths:
+                path.unlink(missing_ok=True)
+                path.with_suffix(".expires").unlink(missing_ok=True)
+
+    def snapshot_stats(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries))
+
+    def _read_memory(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def _store(self, key, df, expires_at, persist=True):
+        with self._lock:
+            self._entries[key] = (expires_at, df)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+        if persist and self.cache_dir:
+            path = self._path(key)
+            df.to_parquet(path)
+            path.with_suffix(".expires").write_text(str(expires_at))
+
+    def _read_disk(self, key, now):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            expires_at = float(path.with_suffix(".expires").read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        if expires_at <= now:
+            return None
+        return expires_at, pd.read_parquet(path)
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.parquet"
+
+
+@st.cache_resource
+def get_query_cache():
+    return QueryCache()
+
+
+def diff_stats(before, after):
+    # Stats accumulated between two snapshot_stats() calls, e.g. over one page render
+    return {name: after[name] - before[name] for name in ("hits", "disk_hits", "misses")}
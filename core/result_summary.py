@@ -0,0 +1,58 @@
+import os
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Results up to this many rows are passed to the answer prompt in full
+FULL_RESULT_ROWS = int(os.getenv("ANSWER_FULL_RESULT_ROWS", 20))
+# Rows included alongside column statistics for larger results
+PREVIEW_ROWS = int(os.getenv("ANSWER_PREVIEW_ROWS", 10))
+# Hard cap on the payload length, in characters
+MAX_PAYLOAD_CHARS = int(os.getenv("ANSWER_MAX_PAYLOAD_CHARS", 4000))
+# Longest cell value kept in the payload
+MAX_CELL_CHARS = 80
+
+
+def _format_rows(df):
+    shown = df.copy()
+    for column in shown.columns:
+        if shown[column].dtype == object:
+            shown[column] = shown[column].astype(str).str.slice(0, MAX_CELL_CHARS)
+    return shown.to_csv(index=False)
+
+
+def _column_stats(df):
+    lines = []
+    for column in df.columns:
+        series = df[column]
+        nulls = int(series.isna().sum())
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            lines.append(
+                f"- {column} (numeric): min={series.min()}, max={series.max()}, "
+                f"mean={series.mean():.4g}, sum={series.sum():.4g}, nulls={nulls}"
+            )
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            lines.append(f"- {column} (datetime): min={series.min()}, max={series.max()}, nulls={nulls}")
+        else:
+            top = series.astype(str).value_counts().head(5)
+            values = ", ".join(f"{str(value)[:MAX_CELL_CHARS]} ({count})" for value, count in top.items())
+            lines.append(f"- {column}: {series.nunique()} distinct, top values: {values}, nulls={nulls}")
+    return "\n".join(lines)
+
+
+def summarize_result(df):
+    # Compact, size-bounded text describing a query result for the answer prompt
+    if df.empty:
+        return "The query returned no rows."
+    if len(df) <= FULL_RESULT_ROWS:
+        payload = f"{len(df)} rows:\n{_format_rows(df)}"
+    else:
+        payload = (
+            f"{len(df)} rows in total; column statistics over all rows:\n{_column_stats(df)}\n\n"
+            f"First {PREVIEW_ROWS} rows:\n{_format_rows(df.head(PREVIEW_ROWS))}"
+        )
+    if len(payload) > MAX_PAYLOAD_CHARS:
+        payload = payload[:MAX_PAYLOAD_CHARS] + "\n... (truncated)"
+    return payload
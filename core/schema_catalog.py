@@ -0,0 +1,161 @@
+import hashlib
+import os
+import re
+import threading
+import time
+
+import sqlalchemy as sa
+import streamlit as st
+from dotenv import load_dotenv
+
+from core.db import get_engine
+
+load_dotenv()
+
+# How often the catalog is rebuilt from the database, in seconds
+SCHEMA_REFRESH_INTERVAL = int(os.getenv("SCHEMA_REFRESH_INTERVAL", 3600))
+# Optional schema to catalog; the connection's default schema when unset
+SCHEMA_NAME = os.getenv("SCHEMA_NAME") or None
+SAMPLE_ROWS = 3
+# Upper bounds on what goes into a single prompt
+MAX_TABLES = int(os.getenv("SCHEMA_MAX_TABLES", 5))
+MAX_COLUMNS = int(os.getenv("SCHEMA_MAX_COLUMNS", 25))
+
+
+def tokenize(text):
+    # Split identifiers and prose into lowercase word stems: "BusinessUnit_name" -> business, unit, name
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return {word[:-1] if len(word) > 3 and word.endswith("s") else word for word in words}
+
+
+class TableEntry:
+    def __init__(self, name, description, columns, sample_rows):
+        self.name = name
+        self.description = description
+        # [{"name", "type", "description", "primary_key"}]
+        self.columns = columns
+        self.sample_rows = sample_rows
+        self.name_tokens = tokenize(name)
+        self.description_tokens = tokenize(description or "")
+        self.column_tokens = {
+            column["name"]: tokenize(column["name"]) | tokenize(column["description"] or "")
+            for column in columns
+        }
+        self.value_tokens = {
+            column["name"]: tokenize(" ".join(str(row[i]) for row in sample_rows))
+            for i, column in enumerate(columns)
+        }
+
+    def render(self, column_names=None, samples=True):
+        columns = [c for c in self.columns if column_names is None or c["name"] in column_names]
+        lines = [f"CREATE TABLE {self.name} ("]
+        for column in columns:
+            line = f"\t[{column['name']}] {column['type']}"
+            if column["primary_key"]:
+                line += " PRIMARY KEY"
+            if column["description"]:
+                line += f" -- {column['description']}"
+            lines.append(line)
+        lines.append(")")
+        if self.description:
+            lines.insert(0, f"-- {self.description}")
+        if samples and self.sample_rows:
+            indexes = [self.columns.index(c) for c in columns]
+            lines.append(f"/*\n{len(self.sample_rows)} rows from {self.name} table:")
+            lines.append("\t".join(c["name"] for c in columns))
+            for row in self.sample_rows:
+                lines.append("\t".join(str(row[i])[:100] for i in indexes))
+            lines.append("*/")
+        return "\n".join(lines)
+
+
+class SchemaCatalog:
+    def __init__(self, engine, schema=SCHEMA_NAME, refresh_interval=SCHEMA_REFRESH_INTERVAL):
+        self.engine = engine
+        self.schema = schema
+        self.refresh_interval = refresh_interval
+        self.tables = {}
+        self.version = ""
+        self.built_at = 0.0
+        self._lock = threading.Lock()
+
+    def ensure_fresh(self):
+        if time.time() - self.built_at >= self.refresh_interval:
+            with self._lock:
+                if time.time() - self.built_at >= self.refresh_interval:
+                    self.refresh()
+        return self
+
+    def refresh(self):
+        inspector = sa.inspect(self.engine)
+        metadata = sa.MetaData()
+        tables = {}
+        with self.engine.connect() as connection:
+            for table_name in inspector.get_table_names(schema=self.schema):
+                table = sa.Table(table_name, metadata, autoload_with=connection, schema=self.schema)
+                try:
+                    description = inspector.get_table_comment(table_name, schema=self.schema).get("text")
+                except NotImplementedError:
+                    description = None
+                columns = [
+                    {
+                        "name": column.name,
+                        "type": str(column.type.compile(self.engine.dialect)),
+                        "description": column.comment,
+                        "primary_key": column.primary_key,
+                    }
+                    for column in table.columns
+                ]
+                sample_rows = [tuple(row) for row in connection.execute(sa.select(table).limit(SAMPLE_ROWS))]
+                name = f"{self.schema}.{table_name}" if self.schema else table_name
+                tables[name] = TableEntry(name, description, columns, sample_rows)
+
+        self.tables = tables
+        # Only the DDL and descriptions: sample rows change with the data and come back in no fixed order
+        self.version = hashlib.sha256(
+            "\n".join(tables[name].render(samples=False) for name in sorted(tables)).encode("utf-8")
+        ).hexdigest()[:16]
+        self.built_at = time.time()
+
+    def select(self, question, max_tables=MAX_TABLES, max_columns=MAX_COLUMNS):
+        # Pick the tables and columns that share words with the question
+        question_tokens = tokenize(question)
+        scored = []
+        for table in self.tables.values():
+            column_scores = {
+                name: 2 * len(question_tokens & tokens) + len(question_tokens & table.value_tokens[name])
+                for name, tokens in table.column_tokens.items()
+            }
+            table_score = (
+                3 * len(question_tokens & table.name_tokens)
+                + len(question_tokens & table.description_tokens)
+                + sum(column_scores.values())
+            )
+            scored.append((table_score, table, column_scores))
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        # Nothing matches at all: fall back to the first max_tables tables, in catalog order
+        if not scored or scored[0][0] == 0:
+            return [(table, None) for _, table, _ in scored[:max_tables]]
+
+        selection = []
+        for table_score, table, column_scores in scored[:max_tables]:
+            if table_score == 0:
+                break
+            matched = {name for name, score in column_scores.items() if score > 0}
+            if not matched:
+                selection.append((table, None if len(table.columns) <= max_columns else {c["name"] for c in table.columns[:max_columns]}))
+                continue
+            keys = {c["name"] for c in table.columns if c["primary_key"]}
+            ranked = sorted(matched, key=lambda name: column_scores[name], reverse=True)
+            selection.append((table, keys | set(ranked[:max_columns])))
+        return selection
+
+    def table_info(self, question, max_tables=MAX_TABLES, max_columns=MAX_COLUMNS):
+        return "\n\n".join(table.render(columns) for table, columns in self.select(question, max_tables, max_columns))
+
+
+@st.cache_resource
+def get_schema_catalog():
+    return SchemaCatalog(get_engine())
@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Where materialized snapshots and their watermarks are kept
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", ".snapshots")
+# How old a snapshot may get before the next read triggers an incremental refresh, in seconds
+SNAPSHOT_REFRESH_INTERVAL = int(os.getenv("SNAPSHOT_REFRESH_INTERVAL", 300))
+
+
+class Snapshot:
+    # A locally materialized aggregate kept current by fetching only rows past a
+    # high-water mark. `fetch_delta(watermark)` returns new aggregate rows with a
+    # "watermark" column (None means everything); `merge(old, delta)` folds them in.
+    def __init__(self, name, fetch_delta, merge, directory=SNAPSHOT_DIR, refresh_interval=SNAPSHOT_REFRESH_INTERVAL):
+        self.name = name
+        self.fetch_delta = fetch_delta
+        self.merge = merge
+        self.refresh_interval = refresh_interval
+        self.directory = Path(directory)
+        self.data = None
+        self.watermark = None
+        self.refreshed_at = 0.0
+        self.last_refresh = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @property
+    def data_path(self):
+        return self.directory / f"{self.name}.parquet"
+
+    @property
+    def meta_path(self):
+        return self.directory / f"{self.name}.json"
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                self._load()
+        if self._stale():
+            self.refresh(if_stale=True)
+        return self.data
+
+    def _stale(self):
+        return self.data is None or time.time() - self.refreshed_at >= self.refresh_interval
+
+    def refresh(self, full=False, if_stale=False):
+        # With if_stale, skip the refresh when another caller finished one while this one waited
+        with self._lock:
+            self._load()
+            if if_stale and not self._stale():
+                return
+            full = full or self.data is None
+            started = time.perf_counter()
+            delta = self.fetch_delta(None if full else self.watermark)
+            data = delta if full else self.merge(self.data, delta)
+            if full:
+                # A rebuild starts over, so the watermark may also go down
+                self.watermark = pd.to_datetime(delta["watermark"]).max() if not delta.empty else None
+            elif not delta.empty:
+                delta_watermark = pd.to_datetime(delta["watermark"]).max()
+                if self.watermark is None or delta_watermark > self.watermark:
+                    self.watermark = delta_watermark
+            self.data = data.drop(columns="watermark").reset_index(drop=True) if "watermark" in data else data
+            self.refreshed_at = time.time()
+            self.last_refresh = {
+                "mode": "full" if full else "incremental",
+                "rows_fetched": len(delta),
+                "seconds": time.perf_counter() - started,
+            }
+            self._save()
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not (self.data_path.exists() and self.meta_path.exists()):
+            return
+        meta = json.loads(self.meta_path.read_text())
+        self.data = pd.read_parquet(self.data_path)
+        self.watermark = pd.Timestamp(meta["watermark"]) if meta.get("watermark") else None
+        self.refreshed_at = meta.get("refreshed_at", 0.0)
+
+    def _save(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.data.to_parquet(self.data_path)
+        self.meta_path.write_text(json.dumps({
+            "watermark": pd.Timestamp(self.watermark).isoformat() if self.watermark is not None else None,
+            "refreshed_at": self.refreshed_at,
+        }))
@@ -0,0 +1,142 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+from dotenv import load_dotenv
+from langchain_openai import AzureOpenAIEmbeddings
+
+load_dotenv()
+
+# How long a generated query stays reusable, in seconds
+SQL_CACHE_TTL = int(os.getenv("SQL_CACHE_TTL", 3600))
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", 1000))
+# Minimum cosine similarity for a nearest-neighbour hit
+SQL_CACHE_SIMILARITY = float(os.getenv("SQL_CACHE_SIMILARITY", 0.95))
+# Embedding deployment for the semantic level; only exact matches are used when unset
+EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+
+
+def normalize_question(question):
+    question = question.lower().strip()
+    question = re.sub(r"[^\w\s%]", " ", question)
+    return " ".join(question.split())
+
+
+# Words that do not change which rows a question asks for
+STOPWORDS = frozenset("""
+a an the of for in on at by per to from and with is are was were be been what which who how
+show list give get find tell me my our we i please can could you do does did this that these those
+""".split())
+
+
+def question_terms(question):
+    # Content words and numbers. Questions that differ in these need different SQL
+    # however similar their embeddings are ("spend in January" vs "spend in March",
+    # "for Petronas" vs "for Shell", "in 2023" vs "in 2024").
+    return frozenset(word for word in normalize_question(question).split() if word not in STOPWORDS)
+
+
+class SQLCache:
+    def __init__(self, embeddings=None, ttl=SQL_CACHE_TTL, max_entries=SQL_CACHE_MAX_ENTRIES, similarity=SQL_CACHE_SIMILARITY):
+        self.embeddings = embeddings
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        # (schema_version, normalized question) -> entry dict, least recently used first
+        self._entries = OrderedDict()
+        # Row-aligned with _index_keys; unit-length question embeddings
+        self._index = None
+        self._index_keys = []
+        # Recently computed embeddings, so a miss followed by a store embeds only once
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, question, schema_version):
+        # Return (query, "exact" | "semantic") or (None, None)
+        normalized = normalize_question(question)
+        key = (schema_version, normalized)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] > now:
+                self._entries.move_to_end(key)
+                return entry["query"], "exact"
+
+        if self.embeddings is None:
+            return None, None
+        vector = self._embed(normalized)
+        terms = question_terms(question)
+        with self._lock:
+            if self._index is None or not self._index_keys:
+                return None, None
+            scores = self._index @ vector
+            for row in np.argsort(scores)[::-1]:
+                if scores[row] < self.similarity:
+                    break
+                candidate = self._entries.get(self._index_keys[row])
+                if (
+                    candidate is not None and candidate["schema_version"] == schema_version
+                    and candidate["expires_at"] > now and candidate["terms"] == terms
+                ):
+                    return candidate["query"], "semantic"
+        return None, None
+
+    def store(self, question, query, schema_version):
+        normalized = normalize_question(question)
+        key = (schema_version, normalized)
+        vector = self._embed(normalized) if self.embeddings is not None else None
+        with self._lock:
+            self._entries[key] = {
+                "query": query,
+                "schema_version": schema_version,
+                "expires_at": time.time() + self.ttl,
+                "vector": vector,
+                "terms": question_terms(question),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._rebuild_index()
+
+    def evict(self, query):
+        # Drop every entry that returns this query, once it failed the guard or the database
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry["query"] == query]:
+                del self._entries[key]
+            self._rebuild_index()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._rebuild_index()
+
+    def _embed(self, text):
+        with self._lock:
+            vector = self._vectors.get(text)
+        if vector is None:
+            vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+            with self._lock:
+                self._vectors[text] = vector
+                while len(self._vectors) > 128:
+                    self._vectors.popitem(last=False)
+        return vector
+
+    def _rebuild_index(self):
+        self._index_keys = [key for key, entry in self._entries.items() if entry["vector"] is not None]
+        if self._index_keys:
+            self._index = np.vstack([self._entries[key]["vector"] for key in self._index_keys])
+        else:
+            self._index = None
+
+
+@st.cache_resource
+def get_sql_cache():
+    embeddings = None
+    if EMBEDDING_DEPLOYMENT:
+        embeddings = AzureOpenAIEmbeddings(azure_deployment=EMBEDDING_DEPLOYMENT, api_version='2024-08-01-preview')
+    return SQLCache(embeddings=embeddings)
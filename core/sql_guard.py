@@ -0,0 +1,199 @@
+import os
+import re
+import xml.etree.ElementTree as ET
+
+import sqlglot
+from dotenv import load_dotenv
+from sqlglot import exp
+from sqlglot.dialects.tsql import TSQL
+from sqlglot.tokens import TokenType
+
+from core.db import get_engine
+
+load_dotenv()
+
+# Most rows a chatbot query may return; larger or missing TOP clauses are capped
+MAX_RESULT_ROWS = int(os.getenv("CHATBOT_MAX_RESULT_ROWS", 1000))
+# Highest estimated plan cost (StatementSubTreeCost) a chatbot query may have
+COST_BUDGET = float(os.getenv("CHATBOT_COST_BUDGET", 50))
+# Server-side execution limit for a chatbot query, in seconds
+QUERY_TIMEOUT = int(os.getenv("CHATBOT_QUERY_TIMEOUT", 30))
+
+SHOWPLAN_NAMESPACE = "{http://schemas.microsoft.com/sqlserver/2004/07/showplan}"
+
+# Anything that writes, changes schema or runs procedures
+WRITE_EXPRESSIONS = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop,
+    exp.Alter, exp.Into, exp.Command, exp.TruncateTable,
+)
+
+
+class GuardError(Exception):
+    pass
+
+
+def _depths(tokens):
+    # Parenthesis depth of each token
+    depth, depths = 0, []
+    for token in tokens:
+        if token.token_type == TokenType.R_PAREN:
+            depth -= 1
+        depths.append(depth)
+        if token.token_type == TokenType.L_PAREN:
+            depth += 1
+    return depths
+
+
+def _main_query_start(tokens, depths):
+    # Index of the token the main query starts at, after any WITH common table expressions
+    if not tokens or tokens[0].token_type != TokenType.WITH:
+        return 0
+    for i in range(1, len(tokens)):
+        if depths[i] != 0:
+            continue
+        if tokens[i].token_type == TokenType.SELECT:
+            return i
+        if tokens[i].token_type == TokenType.L_PAREN and tokens[i - 1].token_type == TokenType.R_PAREN:
+            return i
+    raise GuardError("Could not find the main query after WITH.")
+
+
+def _cap_select(sql, tokens, depths, start, max_rows):
+    # Put TOP (max_rows) on the main SELECT, replacing a plain TOP that is larger
+    i = start + 1
+    while i < len(tokens) and tokens[i].token_type in (TokenType.DISTINCT, TokenType.ALL):
+        i += 1
+    insert_at = tokens[i - 1].end + 1
+    if i < len(tokens) and tokens[i].token_type == TokenType.TOP:
+        end = i + 1
+        if tokens[end].token_type == TokenType.L_PAREN:
+            while depths[end] > depths[i] or tokens[end].token_type != TokenType.R_PAREN:
+                end += 1
+        end += 1
+        return f"{sql[:tokens[i].start]}TOP ({max_rows}){sql[tokens[end - 1].end + 1:]}"
+    return f"{sql[:insert_at]} TOP ({max_rows}){sql[insert_at:]}"
+
+
+def _wrap(sql, tokens, depths, start, max_rows, move_order_by=True):
+    # Cap a query by selecting from it. A set operation's ORDER BY moves to the outer
+    # query; one that goes with TOP or OFFSET stays inside, where T-SQL allows it.
+    order_by = next(
+        (i for i in range(len(tokens) - 1, start, -1) if depths[i] == 0 and tokens[i].token_type == TokenType.ORDER_BY),
+        None,
+    ) if move_order_by else None
+    body_end = tokens[order_by].start if order_by is not None else len(sql)
+    prefix = sql[:tokens[start].start]
+    wrapped = f"{prefix}SELECT TOP ({max_rows}) * FROM (\n{sql[tokens[start].start:body_end].rstrip()}\n) AS q"
+    if order_by is not None:
+        wrapped += f"\n{sql[body_end:]}"
+    return wrapped
+
+
+def enforce_read_only(sql, max_rows=MAX_RESULT_ROWS):
+    # Return the query with a TOP cap, or raise GuardError. The text that runs is the
+    # original one, with at most a TOP clause added or a wrapping SELECT around it;
+    # sqlglot is only used to check it, since regenerating SQL can change its meaning.
+    try:
+        statements = [statement for statement in sqlglot.parse(sql, read="tsql") if statement is not None]
+    except sqlglot.errors.ParseError as e:
+        raise GuardError(f"Could not parse the generated SQL: {e}") from e
+    if len(statements) != 1:
+        raise GuardError("Only a single SELECT statement is allowed.")
+    statement = statements[0]
+    if not isinstance(statement, (exp.Select, exp.SetOperation)):
+        raise GuardError("Only SELECT statements are allowed.")
+    forbidden = next(statement.find_all(*WRITE_EXPRESSIONS), None)
+    if forbidden is not None:
+        raise GuardError(f"Statements that modify data are not allowed ({forbidden.key.upper()}).")
+
+    sql = sql.strip().rstrip(";").rstrip()
+    tokens = TSQL().tokenize(sql)
+    while tokens and tokens[-1].token_type == TokenType.SEMICOLON:
+        tokens.pop()
+    depths = _depths(tokens)
+    start = _main_query_start(tokens, depths)
+    # OFFSET cannot be combined with TOP, so those queries are wrapped as they are
+    offset = statement.args.get("offset") is not None
+    if isinstance(statement, exp.SetOperation) or offset:
+        # A TOP inside one branch parses as the whole set operation's limit, so the AST cannot tell
+        return _wrap(sql, tokens, depths, start, max_rows, move_order_by=not offset)
+
+    limit = statement.args.get("limit")
+    if not isinstance(limit, exp.Limit):
+        return _cap_select(sql, tokens, depths, start, max_rows)
+    current = limit.expression
+    options = limit.args.get("limit_options")
+    if options and (options.args.get("percent") or options.args.get("with_ties")):
+        # Replacing these would change which rows come back ("TOP 10 WITH TIES" is not "TOP 1000")
+        return _wrap(sql, tokens, depths, start, max_rows, move_order_by=False)
+    if isinstance(current, exp.Literal) and current.is_int and int(current.this) <= max_rows:
+        return sql
+    return _cap_select(sql, tokens, depths, start, max_rows)
+
+
+def _row_limit(statement, max_rows):
+    if isinstance(statement, exp.Subquery):
+        # A parenthesized branch of a set operation
+        return _row_limit(statement.this, max_rows)
+    if statement.args.get("offset") is not None:
+        return 0
+    limit = statement.args.get("limit")
+    if isinstance(statement, exp.SetOperation):
+        # Only complete when no branch is limited; which one a TOP belongs to is not clear
+        branches = (statement.this, statement.expression)
+        if limit is not None or any(_row_limit(branch, max_rows) < max_rows for branch in branches):
+            return 0
+        return max_rows
+    if limit is None:
+        return max_rows
+    count = limit.expression if isinstance(limit, exp.Limit) else limit.args.get("count")
+    options = limit.args.get("limit_options")
+    if options and options.args.get("percent"):
+        return 0
+    if isinstance(count, exp.Literal) and count.is_int:
+        return min(int(count.this), max_rows)
+    return 0
+
+
+def row_limit(sql, max_rows=MAX_RESULT_ROWS):
+    # Rows the result of a query that passed enforce_read_only can be cut off at: a
+    # result with fewer rows is complete. 0 when that cannot be told (PERCENT, OFFSET).
+    return _row_limit(sqlglot.parse_one(sql, read="tsql"), max_rows)
+
+
+def estimate_cost(sql, engine=None):
+    # Estimated subtree cost from SQL Server's plan, without executing the query.
+    # Other databases (local stand-ins) have no comparable plan and report 0.
+    engine = engine or get_engine()
+    if engine.dialect.name != "mssql":
+        return 0.0
+    with engine.connect() as connection:
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute("SET SHOWPLAN_XML ON")
+            try:
+                cursor.execute(sql)
+                plan = cursor.fetchone()[0]
+            finally:
+                cursor.execute("SET SHOWPLAN_XML OFF")
+        finally:
+            cursor.close()
+    costs = [
+        float(statement.get("StatementSubTreeCost", 0))
+        for statement in ET.fromstring(plan).iter(f"{SHOWPLAN_NAMESPACE}StmtSimple")
+    ]
+    return max(costs, default=0.0)
+
+
+def guard_query(sql, engine=None, max_rows=MAX_RESULT_ROWS, cost_budget=COST_BUDGET):
+    # Returns (guarded_sql, estimated_cost); raises GuardError when the query must not run
+    if not sql or not re.search(r"\S", sql):
+        raise GuardError("No SQL query was generated.")
+    guarded = enforce_read_only(sql, max_rows)
+    cost = estimate_cost(guarded, engine)
+    if cost > cost_budget:
+        raise GuardError(
+            f"The query is too expensive to run (estimated cost {cost:.1f}, budget {cost_budget:.1f}). "
+            "Add filters or aggregate to narrow it down."
+        )
+    return guarded, cost
@@ -0,0 +1,212 @@
+import contextvars
+import functools
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+
+from core.prompt_builder import count_tokens
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Local SQLite store for per-node records
+TELEMETRY_DB = os.getenv("TELEMETRY_DB", ".logs/telemetry.sqlite")
+# How long a write or read waits for a lock held by the other side, in seconds
+TELEMETRY_BUSY_TIMEOUT = float(os.getenv("TELEMETRY_BUSY_TIMEOUT", 10))
+# Most records inserted per transaction
+TELEMETRY_BATCH_SIZE = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS node_runs (
+    run_id TEXT,
+    node TEXT,
+    started_at REAL,
+    wall_ms REAL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    cached_tokens INTEGER,
+    db_ms REAL,
+    rows INTEGER,
+    cache_hit TEXT,
+    error TEXT
+)
+"""
+
+# Current chatbot request and graph node, for code that runs inside a node
+_run_id = contextvars.ContextVar("telemetry_run_id", default=None)
+_span = contextvars.ContextVar("telemetry_span", default=None)
+
+
+def start_run():
+    run_id = uuid.uuid4().hex
+    _run_id.set(run_id)
+    return run_id
+
+
+def annotate(**values):
+    # Add to the current node's record; numeric values accumulate
+    span = _span.get()
+    if span is None:
+        return
+    for key, value in values.items():
+        if isinstance(value, (int, float)) and isinstance(span.get(key), (int, float)):
+            span[key] += value
+        else:
+            span[key] = value
+
+
+class UsageCallback(BaseCallbackHandler):
+    # Adds token usage reported by chat models to the current node's record
+    def __init__(self):
+        # Locally counted prompt tokens per run, for responses that report no usage
+        self._prompt_tokens = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._prompt_tokens[run_id] = sum(
+            count_tokens(str(message.content)) for batch in messages for message in batch
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._prompt_tokens.pop(run_id, None)
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        prompt_tokens = self._prompt_tokens.pop(run_id, 0)
+        reported = False
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    reported = True
+                    annotate(
+                        prompt_tokens=usage.get("input_tokens", 0),
+                        completion_tokens=usage.get("output_tokens", 0),
+                        cached_tokens=(usage.get("input_token_details") or {}).get("cache_read", 0),
+                    )
+        if reported:
+            return
+        # Otherwise the provider's raw token counts, when it sent any
+        token_usage = (response.llm_output or {}).get("token_usage")
+        if token_usage:
+            annotate(
+                prompt_tokens=token_usage.get("prompt_tokens") or 0,
+                completion_tokens=token_usage.get("completion_tokens") or 0,
+                cached_tokens=(token_usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0,
+            )
+            return
+        # Streamed responses (the answer) report nothing; count both sides locally
+        annotate(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=sum(count_tokens(generation.text) for generations in response.generations
+                                  for generation in generations),
+        )
+
+
+class TelemetryStore:
+    # Records are written by a background thread so nodes never wait on SQLite
+    def __init__(self, path=TELEMETRY_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as connection:
+            # WAL lets the Admin page read while the writer commits
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(SCHEMA)
+        self._queue = queue.Queue()
+        threading.Thread(target=self._write_loop, name="telemetry-writer", daemon=True).start()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=TELEMETRY_BUSY_TIMEOUT)
+
+    def record(self, span):
+        self._queue.put(span)
+
+    def _write_loop(self):
+        connection = self._connect()
+        columns = ["run_id", "node", "started_at", "wall_ms", "prompt_tokens", "completion_tokens",
+                   "cached_tokens", "db_ms", "rows", "cache_hit", "error"]
+        insert = f"INSERT INTO node_runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        while True:
+            # Everything already queued goes in one transaction
+            batch = [self._queue.get()]
+            while len(batch) < TELEMETRY_BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get())
+            try:
+                with connection:
+                    connection.executemany(insert, [[span.get(column) for column in columns] for span in batch])
+            except sqlite3.Error:
+                # Drop this batch rather than the writer thread; later records still get written
+                logger.exception("Could not write %d telemetry records", len(batch))
+
+    def load(self, since_seconds=None):
+        query = "SELECT * FROM node_runs"
+        params = ()
+        if since_seconds is not None:
+            query += " WHERE started_at >= ?"
+            params = (time.time() - since_seconds,)
+        with self._connect() as connection:
+            return pd.read_sql_query(query, connection, params=params)
+
+    def latency_summary(self, since_seconds=None):
+        df = self.load(since_seconds)
+        if df.empty:
+            return df
+        grouped = df.groupby("node")
+        return pd.DataFrame({
+            "runs": grouped.size(),
+            "p50_ms": grouped["wall_ms"].quantile(0.5),
+            "p95_ms": grouped["wall_ms"].quantile(0.95),
+            "db_p95_ms": grouped["db_ms"].quantile(0.95),
+            "avg_prompt_tokens": grouped["prompt_tokens"].mean(),
+            "avg_cached_tokens": grouped["cached_tokens"].mean(),
+            "avg_completion_tokens": grouped["completion_tokens"].mean(),
+            "cache_hits": grouped["cache_hit"].apply(lambda hits: int(hits.fillna("").astype(bool).sum())),
+            "errors": grouped["error"].apply(lambda errors: int(errors.fillna("").astype(bool).sum())),
+        })
+
+
+@st.cache_resource
+def get_telemetry_store():
+    return TelemetryStore()
+
+
+def instrument(node, func):
+    # Wrap an async graph node so each call is timed and recorded
+    @functools.wraps(func)
+    async def wrapper(state):
+        span = {
+            "run_id": _run_id.get(),
+            "node": node,
+            "started_at": time.time(),
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "db_ms": 0.0,
+        }
+        token = _span.set(span)
+        started = time.perf_counter()
+        update = None
+        try:
+            update = await func(state)
+        except BaseException as e:
+            span["error"] = repr(e)
+            raise
+        finally:
+            _span.reset(token)
+            span["wall_ms"] = (time.perf_counter() - started) * 1000
+            if isinstance(update, dict):
+                span.setdefault("rows", update.get("row_count"))
+                span.setdefault("cache_hit", update.get("cache_hit") or None)
+                span["error"] = update.get("error") or None
+            get_telemetry_store().record(span)
+        return update
+    return wrapper
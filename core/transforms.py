@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+MONTH_YEAR_FORMAT = '%b %Y'
+
+
+def month_dimension(start='2023-01-01', end='2023-12-01'):
+    return pd.date_range(start=start, end=end, freq='MS')
+
+
+def assign_month_year(df, months=None):
+    # Cycle the month dimension across the rows as datetime64 and sort by it.
+    # Stays typed; use format_month_year() at render time.
+    months = month_dimension() if months is None else months
+    positions = np.arange(len(df)) % len(months)
+    df = df.assign(MonthYear=months.values[positions])
+    return df.sort_values('MonthYear', kind='stable')
+
+
+def format_month_year(df, column='MonthYear'):
+    return df.assign(**{column: df[column].dt.strftime(MONTH_YEAR_FORMAT)})
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+
+import streamlit as st
+from dotenv import load_dotenv
+
+from core.auth import get_auth_client
+from core.chat_executor import get_chat_executor
+from core.chatbot_service import get_chatbot_service
+from core.dashboard_data import ASSET_PAGE_SIZES, load_asset_page, refresh_snapshots
+from core.db import DATABASE_URL, POOL_SIZE, get_engine, get_token_provider
+from core.prompt_builder import get_encoding
+from core.schema_catalog import get_schema_catalog
+from core.telemetry import get_telemetry_store
+
+load_dotenv()
+
+# How often the warm-up runs again after the first pass, in seconds; 0 runs it once
+WARMUP_INTERVAL = int(os.getenv("WARMUP_INTERVAL", 300))
+
+
+def open_pool_connections():
+    # Open the pool's steady-state connections up front; closing returns them to the pool
+    engine = get_engine()
+    connections = []
+    try:
+        for _ in range(POOL_SIZE):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.exec_driver_sql("SELECT 1")
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def fetch_token():
+    if not DATABASE_URL:
+        get_token_provider().get_token()
+
+
+def prefetch_dashboard():
+    # Sessions may already have refreshed an expired snapshot meanwhile
+    refresh_snapshots(if_stale=True)
+    # The asset table's first page as the dashboard opens it
+    load_asset_page(ASSET_PAGE_SIZES[0])
+
+
+def start_chatbot():
+    get_chatbot_service()
+    get_chat_executor()
+    get_encoding()
+
+
+# Run in order: later steps reuse what earlier ones set up
+WARMUP_STEPS = [
+    ("sign-in client", lambda: get_auth_client().login_url()),
+    ("database token", fetch_token),
+    ("connection pool", open_pool_connections),
+    ("schema catalog", lambda: get_schema_catalog().ensure_fresh()),
+    ("dashboard data", prefetch_dashboard),
+    ("chatbot", start_chatbot),
+    ("telemetry", get_telemetry_store),
+]
+
+
+class Warmup:
+    # Builds the process-wide resources in a background thread so the first
+    # sessions after a restart do not pay for them, then repeats on an interval
+    # to keep the pool, catalog and snapshots current.
+    def __init__(self, steps=WARMUP_STEPS, interval=WARMUP_INTERVAL):
+        self.steps = steps
+        self.interval = interval
+        # True once the first pass has finished, whether or not every step succeeded
+        self.ready = threading.Event()
+        self.started_at = time.time()
+        self.passes = 0
+        # {step: {"seconds", "error", "finished_at"}} from the latest pass
+        self.timings = {}
+        self.total_seconds = None
+        threading.Thread(target=self._loop, name="warmup", daemon=True).start()
+
+    def _loop(self):
+        while True:
+            self.run_once()
+            self.ready.set()
+            if self.interval <= 0:
+                return
+            time.sleep(self.interval)
+
+    def run_once(self):
+        started = time.perf_counter()
+        for name, step in self.steps:
+            step_started = time.perf_counter()
+            error = None
+            try:
+                step()
+            except Exception as e:
+                error = str(e)
+            self.timings[name] = {
+                "seconds": time.perf_counter() - step_started,
+                "error": error,
+                "finished_at": time.time(),
+            }
+        self.passes += 1
+        self.total_seconds = time.perf_counter() - started
+
+    def status(self):
+        return {
+            "ready": self.ready.is_set(),
+            "passes": self.passes,
+            "total_seconds": self.total_seconds,
+            "uptime_seconds": time.time() - self.started_at,
+            "steps": dict(self.timings),
+        }
+
+
+@st.cache_resource
+def start_warmup():
+    return Warmup()
@@ -1,5 +1,6 @@
 from .chatbot import show_page2
 from .dashboard import show_page1
+from .admin import show_page3
 import streamlit as st
 
 def show_main():
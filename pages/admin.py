@@ -0,0 +1,61 @@
+import pandas as pd
+import streamlit as st
+from core.db import pool_status
+from core.telemetry import get_telemetry_store
+from core.warmup import start_warmup
+
+WINDOWS = {
+    "Last hour": 3600,
+    "Last 24 hours": 86400,
+    "Last 7 days": 7 * 86400,
+    "All time": None,
+}
+
+def show_warmup():
+    st.subheader("Warm-up")
+    status = start_warmup().status()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Ready", "Yes" if status["ready"] else "Warming up")
+    col2.metric("Passes", status["passes"])
+    if status["total_seconds"] is not None:
+        col3.metric("Last pass", f"{status['total_seconds']:.2f}s")
+    if status["steps"]:
+        st.dataframe(pd.DataFrame.from_dict(status["steps"], orient="index").round(3))
+
+def show_pool():
+    st.subheader("Database connection pool")
+    status = pool_status()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Pool size", status["pool_size"])
+    col2.metric("Max overflow", status["max_overflow"])
+    col3.metric("Recycle after", f"{status['recycle']}s")
+    st.caption(status["status"])
+
+def show_page3():
+    st.title("Admin")
+    show_warmup()
+    show_pool()
+
+    st.subheader("Chatbot pipeline latency")
+
+    window = st.selectbox("Window", list(WINDOWS), index=1)
+    store = get_telemetry_store()
+    summary = store.latency_summary(WINDOWS[window])
+
+    if summary.empty:
+        st.info("No chatbot requests have been recorded in this window yet.")
+        return
+
+    st.dataframe(summary.round(1))
+    st.bar_chart(summary[["p50_ms", "p95_ms"]])
+
+    # End-to-end latency per request is the sum of its node times
+    runs = store.load(WINDOWS[window])
+    per_run = runs.groupby("run_id")["wall_ms"].sum()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Requests", f"{len(per_run):,}")
+    col2.metric("p50 end-to-end", f"{per_run.quantile(0.5) / 1000:.2f}s")
+    col3.metric("p95 end-to-end", f"{per_run.quantile(0.95) / 1000:.2f}s")
+
+    with st.expander("Recent node records"):
+        st.dataframe(runs.sort_values("started_at", ascending=False).head(200))
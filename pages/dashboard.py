@@ -1,104 +1,55 @@
 import streamlit as st
-from azure.identity import ClientSecretCredential
-import os
-import urllib
-import sqlalchemy as sa
-from itertools import chain, repeat
-import struct
-import pandas as pd
-from sqlalchemy import create_engine, text
 import plotly.graph_objects as go
 import numpy as np
-from datetime import date
 import datetime
+from core.dashboard_data import ASSET_PAGE_SIZES, ASSET_SORT_COLUMNS, get_snapshots, load_asset_page, load_assets, load_kpis, load_monthly_spend, refresh_snapshots
+from core.transforms import assign_month_year
+from core.downsample import area_trace, payload_bytes
+from core.fetch import fetch_stats
+from core.loader import get_dashboard_loader
+from core.query_cache import get_query_cache, diff_stats
 
-def show_page1():
-    st.title("Procurement Dashboard")
-    st.write("Time series chart of Actual vs. Budget Spend")
-    tenant_id = os.getenv("TENANT_ID")
-    client_id = os.getenv("CLIENT_ID")
-    client_secret = os.getenv("CLIENT_SECRET")
-    # Initialize the credential
-    credential = ClientSecretCredential(
-        tenant_id=tenant_id,
-        client_id=client_id,
-        client_secret=client_secret
-    )
-    resource_url = "https://database.windows.net/.default"
-
-    # Get the token
-    token_object = credential.get_token(resource_url)
+# Keyset-paginated asset table: only the visible page is fetched from the database.
+# Controls are drawn first so the page query can be submitted with the others.
+def asset_table_controls():
+    controls = st.columns([2, 2, 1, 1])
+    name_filter = controls[0].text_input("Filter by asset name", key="asset_filter")
+    sort_column = controls[1].selectbox("Sort by", list(ASSET_SORT_COLUMNS), key="asset_sort")
+    descending = controls[2].toggle("Descending", key="asset_desc")
+    page_size = controls[3].selectbox("Rows", ASSET_PAGE_SIZES, key="asset_page_size")
 
-    sql_endpoint = os.getenv("sql_endpoint")
-    database = os.getenv("database")
+    # Cursors of the pages before the current one; reset when the view changes
+    view = (name_filter, sort_column, descending, page_size)
+    if st.session_state.get("asset_view") != view:
+        st.session_state["asset_view"] = view
+        st.session_state["asset_cursors"] = [None]
+    cursors = st.session_state["asset_cursors"]
+    return lambda: load_asset_page(page_size, sort_column, descending, name_filter or None, cursors[-1])
 
-    connection_string = f"Driver={{ODBC Driver 18 for SQL Server}};Server={sql_endpoint},1433;Database={database};Encrypt=Yes;TrustServerCertificate=No"
-    params = urllib.parse.quote(connection_string)
+def render_asset_page(page, next_cursor):
+    cursors = st.session_state["asset_cursors"]
+    st.table(page)
 
-    # Retrieve and encode access token
-    token_as_bytes = bytes(token_object.token, "UTF-8")
-    encoded_bytes = bytes(chain.from_iterable(zip(token_as_bytes, repeat(0))))
-    token_bytes = struct.pack("<i", len(encoded_bytes)) + encoded_bytes
-    attrs_before = {1256: token_bytes}
+    nav = st.columns([1, 1, 4])
+    if nav[0].button("Previous", disabled=len(cursors) == 1, key="asset_prev"):
+        cursors.pop()
+        st.rerun()
+    if nav[1].button("Next", disabled=next_cursor is None, key="asset_next"):
+        cursors.append(next_cursor)
+        st.rerun()
+    nav[2].caption(f"Page {len(cursors)}")
 
-    # Build the connection
-    engine = sa.create_engine("mssql+pyodbc:///?odbc_connect={0}".format(params), connect_args={'attrs_before': attrs_before})
-    st.subheader("Asset Management")
-    # Summary metrics (placeholder values from image)
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Total Available Hours", "4.83K")
-    col2.metric("Total Usage Hours", "1.20K")
-    col3.metric("Avg Utilization Rate", "24.65")
-    col4.metric("Avg Turnover Rate", "1.47")
-
-    # Query asset_utilization table
-    asset_query = text("""
-    SELECT 
-        asset_name,
-        AVG(asset_turnover_rate) AS asset_turnover_rate,
-        AVG(utilization_rate) AS utilization_rate,
-        MAX(last_maintenance_date) AS last_maintenance_date,
-        AVG(usage_hours) AS usage_hours
-    FROM 
-        sc_stg.asset_utilization
-    GROUP BY 
-        asset_name
-    ORDER BY 
-        MAX(last_maintenance_date) ASC
-    """)
-
-    with engine.connect() as connection:
-        asset_results = connection.execute(asset_query)
-        df_assets = pd.DataFrame(asset_results.fetchall(), columns=asset_results.keys())
-
-    # Ensure data types are correct
-    df_assets['asset_turnover_rate'] = df_assets['asset_turnover_rate'].fillna(0).astype(float)
-    df_assets['utilization_rate'] = df_assets['utilization_rate'].fillna(0).astype(float)
-    df_assets['usage_hours'] = df_assets['usage_hours'].fillna(0).astype(float)
-    df_assets['last_maintenance_date'] = pd.to_datetime(df_assets['last_maintenance_date'])
-
-    # Generate dummy MonthYear column
-    months = pd.date_range(start='2023-01-01', end='2023-12-01', freq='MS')
-    dummy_months = np.tile(months.to_pydatetime(), len(df_assets) // len(months) + 1)[:len(df_assets)]
-    df_assets['MonthYear'] = [pd.Timestamp(date).strftime('%b %Y') for date in dummy_months]  # Use pd.Timestamp for safety
-
-    # Sort by MonthYear for visualization
-    df_assets['MonthYear'] = pd.to_datetime(df_assets['MonthYear'], format='%b %Y')
-    df_assets = df_assets.sort_values('MonthYear')
-    df_assets['MonthYear'] = df_assets['MonthYear'].dt.strftime('%b %Y')  # Reformat for display
-
-    # Display asset management table
-    st.table(df_assets)
-
-    # Utilization & Turnover Rate Analysis Chart
-    st.subheader("Utilization & Turnover Rate Analysis")
+def build_utilization_figure(df, width_px, method, x_range=None):
     # Create Plotly chart
     fig = go.Figure()
 
     # Add utilization_rate trace with area fill
-    fig.add_trace(go.Scatter(
-        x=df_assets['MonthYear'],
-        y=df_assets['utilization_rate'],
+    fig.add_trace(area_trace(
+        df['MonthYear'],
+        df['utilization_rate'],
+        width_px,
+        method=method,
+        x_range=x_range,
         name='Utilization Rate',
         line=dict(color='#FF4500', width=2),
         fill='tonexty',
@@ -107,9 +58,12 @@ def show_page1():
     ))
 
     # Add asset_turnover_rate trace with area fill
-    fig.add_trace(go.Scatter(
-        x=df_assets['MonthYear'],
-        y=df_assets['asset_turnover_rate'],
+    fig.add_trace(area_trace(
+        df['MonthYear'],
+        df['asset_turnover_rate'],
+        width_px,
+        method=method,
+        x_range=x_range,
         name='Asset Turnover Rate',
         line=dict(color='#4682B4', width=1.5),
         fill='tozeroy',
@@ -121,60 +75,26 @@ def show_page1():
     fig.update_layout(
         title='Utilization & Turnover Rate Analysis',
         xaxis_title='MonthYear',
+        xaxis_tickformat='%b %Y',
         yaxis_title='Rate (%)',
         template='plotly_dark',
         height=400,
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
     )
 
-    # Display chart
-    st.plotly_chart(fig)
-
-    # SQL query to join dim_calendar and cost_savings
-    st.subheader("Actual vs. Budget Spend Over Time")
-    business_units_query = text("""
-    SELECT 
-        FORMAT(dc.date, 'MMM yyyy') AS MonthYear,
-        SUM(cs.actual_cost) AS actual_cost,
-        SUM(cs.budget_cost) AS budget_cost
-    FROM 
-        sc_stg.dim_calendar dc
-    INNER JOIN 
-        sc_stg.cost_savings cs
-    ON 
-        dc.date = cs.savings_date
-    GROUP BY 
-        dc.date
-    ORDER BY 
-        dc.date ASC
-    """)
-
-    # Execute query and load data into pandas DataFrame
-    with engine.connect() as connection:
-        results = connection.execute(business_units_query)
-        df = pd.DataFrame(results.fetchall(), columns=results.keys())
-
-    # Ensure data types are correct
-    df['actual_cost'] = df['actual_cost'].fillna(0).astype(float)
-    df['budget_cost'] = df['budget_cost'].fillna(0).astype(float)
-
-    # Sort by MonthYear index
-    df['MonthYear'] = pd.to_datetime(df['MonthYear'], format='%b %Y').dt.to_period('M')
-    df = df.sort_values('MonthYear')
-    df.set_index('MonthYear', inplace=True)
-    df.index = df.index.strftime('%b %Y')
-
-    # Display raw data
-    st.write("Data Preview:")
-    st.dataframe(df)
+    return fig
 
+def build_spend_figure(df, width_px, method, x_range=None):
     # Create Plotly chart for Actual vs. Budget
     fig_spend = go.Figure()
 
     # Add actual_cost trace with area fill
-    fig_spend.add_trace(go.Scatter(
-        x=df.index,
-        y=df['actual_cost'],
+    fig_spend.add_trace(area_trace(
+        df.index.to_timestamp(),
+        df['actual_cost'],
+        width_px,
+        method=method,
+        x_range=x_range,
         name='Actual Cost',
         line=dict(color='#FF4500', width=2),
         fill='tonexty',
@@ -183,9 +103,12 @@ def show_page1():
     ))
 
     # Add budget_cost trace with area fill
-    fig_spend.add_trace(go.Scatter(
-        x=df.index,
-        y=df['budget_cost'],
+    fig_spend.add_trace(area_trace(
+        df.index.to_timestamp(),
+        df['budget_cost'],
+        width_px,
+        method=method,
+        x_range=x_range,
         name='Budget Cost',
         line=dict(color='#4682B4', width=1.5),
         fill='tozeroy',
@@ -197,12 +120,142 @@ def show_page1():
     fig_spend.update_layout(
         title='Actual Vs Budget Spend',
         xaxis_title='Date',
+        xaxis_tickformat='%b %Y',
         yaxis_title='Cost ($M)',
         template='plotly_dark',
         height=400,
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
     )
 
-    # Display chart
-    st.plotly_chart(fig_spend)
-        
\ No newline at end of file
+    return fig_spend
+
+# Optional zoom into the full-resolution series; the chart is re-downsampled for the range
+def chart_zoom(values, key):
+    if len(values) < 2:
+        return None
+    low, high = values.min().to_pydatetime(), values.max().to_pydatetime()
+    if low == high:
+        return None
+    selected = st.slider("Zoom", min_value=low, max_value=high, value=(low, high), format="MMM YYYY", key=key)
+    return (np.datetime64(selected[0]), np.datetime64(selected[1]))
+
+def report_payload(fig, full_fig):
+    shown = sum(len(trace.x) for trace in fig.data)
+    total = sum(len(trace.x) for trace in full_fig.data)
+    st.caption(
+        f"{shown:,} of {total:,} points sent · payload {payload_bytes(fig) / 1024:,.1f} KB "
+        f"(full resolution {payload_bytes(full_fig) / 1024:,.1f} KB)"
+    )
+
+def show_page1():
+    st.title("Procurement Dashboard")
+    st.write("Time series chart of Actual vs. Budget Spend")
+    cache = get_query_cache()
+    refresh_col, rebuild_col = st.columns([1, 4])
+    if refresh_col.button("Refresh data"):
+        cache.invalidate()
+        refresh_snapshots()
+    if rebuild_col.button("Rebuild snapshots"):
+        cache.invalidate()
+        refresh_snapshots(full=True)
+    stats_before = cache.snapshot_stats()
+
+    st.subheader("Asset Management")
+    # Lay out every section first; each is filled in as its data arrives
+    kpi_section = st.container()
+    table_section = st.container()
+    utilization_section = st.container()
+    spend_section = st.container()
+
+    with table_section:
+        load_table_page = asset_table_controls()
+
+    with utilization_section:
+        # Utilization & Turnover Rate Analysis Chart
+        st.subheader("Utilization & Turnover Rate Analysis")
+        with st.expander("Chart settings"):
+            settings = st.columns(3)
+            # Streamlit does not report the viewport width, so the target width is a setting
+            width_px = settings[0].number_input("Chart width (px)", min_value=200, max_value=4000, value=1200, step=100)
+            method = settings[1].selectbox("Downsampling", ["lttb", "minmax", "none"])
+            show_payload = settings[2].checkbox("Show payload size")
+
+    with spend_section:
+        # Actual vs. Budget spend, aggregated per month in SQL
+        st.subheader("Actual vs. Budget Spend Over Time")
+        filter_col1, filter_col2 = st.columns(2)
+        start_date = filter_col1.date_input("From", value=None)
+        end_date = filter_col2.date_input("To", value=None)
+        # The query's range is half-open; include the whole "To" day
+        spend_end = end_date + datetime.timedelta(days=1) if end_date else None
+
+    # The page's queries are independent, so they run concurrently
+    loaders = {
+        "kpis": load_kpis,
+        "asset table": load_table_page,
+        "asset utilization": load_assets,
+        "monthly spend": lambda: load_monthly_spend(start_date, spend_end),
+    }
+    sections = {
+        "kpis": kpi_section,
+        "asset table": table_section,
+        "asset utilization": utilization_section,
+        "monthly spend": spend_section,
+    }
+    timings = {}
+    for result in get_dashboard_loader().run(loaders):
+        timings[result.name] = result.seconds
+        with sections[result.name]:
+            if result.error is not None:
+                st.error(f"Failed to load {result.name}: {result.error}")
+            elif result.name == "kpis":
+                # Summary metrics from the precomputed monthly rollups
+                period, tiles = result.value
+                for column, tile in zip(st.columns(len(tiles)), tiles):
+                    column.metric(tile["label"], tile["value"], tile["delta"])
+                if period:
+                    st.caption(f"KPI period: {period}")
+            elif result.name == "asset table":
+                # Display asset management table
+                render_asset_page(*result.value)
+            elif result.name == "asset utilization":
+                # Generate dummy MonthYear column, kept as datetime64 until display
+                df_assets = assign_month_year(result.value)
+                utilization_range = chart_zoom(df_assets['MonthYear'], "utilization_zoom")
+                fig = build_utilization_figure(df_assets, width_px, method, utilization_range)
+                st.plotly_chart(fig)
+                if show_payload:
+                    report_payload(fig, build_utilization_figure(df_assets, width_px, "none", utilization_range))
+            else:
+                df = result.value
+                # Display raw data
+                st.write("Data Preview:")
+                st.dataframe(df.set_axis(df.index.strftime('%b %Y')))
+
+                spend_range = chart_zoom(df.index.to_timestamp(), "spend_zoom")
+                fig_spend = build_spend_figure(df, width_px, method, spend_range)
+
+                # Display chart
+                st.plotly_chart(fig_spend)
+                if show_payload:
+                    report_payload(fig_spend, build_spend_figure(df, width_px, "none", spend_range))
+
+    st.caption("Query timings: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    # Throughput of the most recent database fetches (cache hits do not fetch)
+    st.caption("Fetches: " + ", ".join(
+        f"{name} {stats['rows']:,} rows at {stats['rows_per_second']:,.0f} rows/s, peak {stats['peak_bytes'] / 1024:,.0f} KB"
+        for name, stats in fetch_stats().items()
+    ))
+    # Report how this render was served
+    render_stats = diff_stats(stats_before, cache.snapshot_stats())
+    st.caption(
+        f"Query cache: {render_stats['hits']} hits, {render_stats['disk_hits']} disk hits, "
+        f"{render_stats['misses']} misses"
+    )
+    for snapshot in get_snapshots().values():
+        last = snapshot.last_refresh
+        st.caption(
+            f"Snapshot {snapshot.name}: watermark {snapshot.watermark:%Y-%m-%d}"
+            + (f", last {last['mode']} refresh fetched {last['rows_fetched']} rows in {last['seconds']:.2f}s" if last else "")
+            if snapshot.watermark is not None else f"Snapshot {snapshot.name}: empty"
+        )
@@ -0,0 +1,28 @@
+import inspect
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+pytest.importorskip("streamlit")
+openai = pytest.importorskip("openai")
+
+from core.chatbot_service import REPAIR_MAX_TOKENS, azure_chat_model
+from core.telemetry import UsageCallback
+
+
+@pytest.fixture(autouse=True)
+def azure_settings(monkeypatch):
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"callbacks": [UsageCallback()]},
+    {"disable_streaming": True, "callbacks": [UsageCallback()]},
+    {"max_tokens": REPAIR_MAX_TOKENS, "disable_streaming": True, "callbacks": [UsageCallback()]},
+])
+def test_chat_models_send_no_unknown_arguments(kwargs):
+    # model_kwargs are passed straight to the client; anything it does not accept fails every call
+    model = azure_chat_model(**kwargs)
+    accepted = set(inspect.signature(openai.resources.chat.Completions.create).parameters)
+    assert set(model.model_kwargs) <= accepted
@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("azure.identity")
+
+import sqlalchemy as sa
+
+from core.fetch import Int, fetch_frame
+
+
+@pytest.fixture
+def engine():
+    engine = sa.create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE t (id INTEGER, cost REAL, vendor TEXT)")
+        connection.exec_driver_sql(
+            "INSERT INTO t VALUES (1, NULL, NULL), (2, NULL, NULL), (3, 1.5, 'Shell'), (4, 2.5, 'Petronas')"
+        )
+    return engine
+
+
+def test_duplicate_column_names_stay_separate(engine):
+    df = fetch_frame("SELECT 1 AS a, 'x' AS a", engine=engine)
+    assert list(df.columns) == ["a", "a"]
+    assert df.shape == (1, 2)
+    assert df.iloc[0].tolist() == [1, "x"]
+
+
+def test_all_null_first_chunk(engine):
+    df = fetch_frame("SELECT id, cost, vendor FROM t ORDER BY id", engine=engine, chunk_size=2)
+    assert str(df["id"].dtype) == "int64"
+    assert str(df["cost"].dtype) == "float64"
+    assert df["cost"].isna().tolist() == [True, True, False, False]
+    assert df["vendor"].isna().tolist() == [True, True, False, False]
+    assert df["vendor"].iloc[2:].tolist() == ["Shell", "Petronas"]
+
+
+def test_null_throughout_is_object(engine):
+    df = fetch_frame("SELECT vendor FROM t WHERE id <= 2", engine=engine)
+    assert df["vendor"].dtype == object
+    assert df["vendor"].isna().all()
+
+
+def test_large_ints_keep_precision(engine):
+    df = fetch_frame("SELECT 9007199254740993 AS n", engine=engine)
+    assert df["n"].tolist() == [9007199254740993]
+    df = fetch_frame("SELECT 9007199254740993 AS n", schema={"n": Int()}, engine=engine)
+    assert df["n"].tolist() == [9007199254740993]
+
+
+def test_declared_int_fill(engine):
+    df = fetch_frame("SELECT CAST(cost AS INTEGER) AS n FROM t ORDER BY id", schema={"n": Int(0)}, engine=engine)
+    assert str(df["n"].dtype) == "int64"
+    assert df["n"].tolist() == [0, 0, 1, 2]
@@ -0,0 +1,75 @@
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("azure.identity")
+
+from core.sql_guard import GuardError, enforce_read_only, row_limit
+
+
+def normalized(sql):
+    return " ".join(sql.split())
+
+
+@pytest.mark.parametrize("sql, expected", [
+    # Already capped: runs as written
+    ("SELECT TOP 10 a FROM t ORDER BY a;", "SELECT TOP 10 a FROM t ORDER BY a"),
+    ("SELECT TOP (1000) a FROM t", "SELECT TOP (1000) a FROM t"),
+    # Missing or larger TOP: capped in place
+    ("SELECT a FROM t", "SELECT TOP (1000) a FROM t"),
+    ("SELECT DISTINCT a FROM t", "SELECT DISTINCT TOP (1000) a FROM t"),
+    ("SELECT TOP 5000 a FROM t ORDER BY a", "SELECT TOP (1000) a FROM t ORDER BY a"),
+    ("SELECT TOP (5000) ISNULL(a, 0) AS a FROM t", "SELECT TOP (1000) ISNULL(a, 0) AS a FROM t"),
+    # PERCENT, WITH TIES and OFFSET keep their own semantics inside a wrapping SELECT
+    ("SELECT TOP 10 PERCENT a FROM t ORDER BY a",
+     "SELECT TOP (1000) * FROM ( SELECT TOP 10 PERCENT a FROM t ORDER BY a ) AS q"),
+    ("SELECT TOP 10 WITH TIES vendor, SUM(cost) AS spend FROM t GROUP BY vendor ORDER BY spend DESC",
+     "SELECT TOP (1000) * FROM ( SELECT TOP 10 WITH TIES vendor, SUM(cost) AS spend FROM t "
+     "GROUP BY vendor ORDER BY spend DESC ) AS q"),
+    ("SELECT a FROM t ORDER BY a OFFSET 10 ROWS FETCH NEXT 5 ROWS ONLY",
+     "SELECT TOP (1000) * FROM ( SELECT a FROM t ORDER BY a OFFSET 10 ROWS FETCH NEXT 5 ROWS ONLY ) AS q"),
+    ("SELECT a FROM t ORDER BY a OFFSET 10 ROWS",
+     "SELECT TOP (1000) * FROM ( SELECT a FROM t ORDER BY a OFFSET 10 ROWS ) AS q"),
+    # Common table expressions stay in front; the main query is capped
+    ("WITH c AS (SELECT a FROM t) SELECT a FROM c",
+     "WITH c AS (SELECT a FROM t) SELECT TOP (1000) a FROM c"),
+    ("WITH c AS (SELECT TOP 5 a FROM t) SELECT TOP 10 PERCENT a FROM c ORDER BY a",
+     "WITH c AS (SELECT TOP 5 a FROM t) SELECT TOP (1000) * FROM ( SELECT TOP 10 PERCENT a FROM c ORDER BY a ) AS q"),
+    # Set operations are wrapped, with their ORDER BY outside
+    ("SELECT a FROM x UNION SELECT a FROM y ORDER BY a",
+     "SELECT TOP (1000) * FROM ( SELECT a FROM x UNION SELECT a FROM y ) AS q ORDER BY a"),
+    ("WITH c AS (SELECT a FROM t) SELECT a FROM c UNION ALL SELECT a FROM y",
+     "WITH c AS (SELECT a FROM t) SELECT TOP (1000) * FROM ( SELECT a FROM c UNION ALL SELECT a FROM y ) AS q"),
+])
+def test_caps_rows(sql, expected):
+    assert normalized(enforce_read_only(sql, max_rows=1000)) == expected
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT a INTO #copy FROM t",
+    "SELECT a FROM t; DELETE FROM t",
+    "SELECT a FROM t; SELECT b FROM u",
+    "DELETE FROM t",
+    "UPDATE t SET a = 1",
+    "DROP TABLE t",
+    "EXEC sp_who",
+    "WITH c AS (SELECT a FROM t) DELETE FROM t",
+])
+def test_rejects(sql):
+    with pytest.raises(GuardError):
+        enforce_read_only(sql, max_rows=1000)
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT a FROM t", 1000),
+    ("SELECT TOP 100 a FROM t ORDER BY a", 100),
+    ("SELECT TOP (5000) a FROM t", 1000),
+    ("SELECT TOP 10 WITH TIES a FROM t ORDER BY a", 10),
+    ("SELECT TOP 10 PERCENT a FROM t ORDER BY a", 0),
+    ("SELECT a FROM t ORDER BY a OFFSET 0 ROWS FETCH NEXT 50 ROWS ONLY", 0),
+    ("SELECT a FROM x UNION SELECT a FROM y", 1000),
+    ("SELECT TOP 5 a FROM x UNION SELECT a FROM y", 0),
+    ("(SELECT TOP 5 a FROM x) UNION SELECT a FROM y", 0),
+    ("WITH c AS (SELECT TOP 5 a FROM t) SELECT a FROM c", 1000),
+])
+def test_row_limit(sql, expected):
+    assert row_limit(sql, max_rows=1000) == expected